@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifer: GPL-3.0-or-later
+#
+# Throughput of writing model output to a client fd. Compares copying each
+# sentence into bytes and writing it through a file object, as the workers
+# used to, with handing the sample buffers to DirectOutput as providers do.
+# The client end of the pipe is drained by a thread.
+#
+# Run with the common package on the path:
+#   PYTHONPATH=providers/common python3 benchmarks/fd_throughput.py
+
+import argparse
+import json
+import os
+import threading
+from time import perf_counter
+
+import numpy as np
+from gi.repository import GLib
+
+from speech_provider_common.transport import DirectOutput
+
+SAMPLE_RATE = 22050
+
+
+def drain(fd):
+    while os.read(fd, 1 << 16):
+        pass
+    os.close(fd)
+
+
+def sentences(count, seconds):
+    # Model output is float, the conversion to int16 is common to both paths.
+    rng = np.random.default_rng(0)
+    return [
+        (rng.standard_normal(int(SAMPLE_RATE * seconds)) * 8000).astype(np.int16)
+        for _ in range(count)
+    ]
+
+
+def copying(fd, audio, silence):
+    calls = 0
+    ww = os.fdopen(fd, "wb", buffering=0)
+    for samples in audio:
+        ww.write(samples.tobytes() + silence)
+        calls += 1
+    ww.close()
+    return calls
+
+
+def direct(fd, audio, silence):
+    # Written from a synthesis thread, what the pipe doesn't take right
+    # away is written from the main loop.
+    output = DirectOutput(fd)
+    loop = GLib.MainLoop()
+    output.connect("done", lambda output: loop.quit())
+
+    def synthesize():
+        for samples in audio:
+            output.write(samples, silence)
+        output.close()
+
+    writer = threading.Thread(target=synthesize)
+    writer.start()
+    loop.run()
+    writer.join()
+    return len(audio)
+
+
+def bench(write, audio, silence):
+    r, w = os.pipe()
+    reader = threading.Thread(target=drain, args=(r,))
+    reader.start()
+    start = perf_counter()
+    calls = write(w, audio, silence)
+    elapsed = perf_counter() - start
+    reader.join()
+    total_bytes = sum(samples.nbytes + len(silence) for samples in audio)
+    audio_seconds = total_bytes / 2 / SAMPLE_RATE
+    return {
+        "mb-per-second": total_bytes / elapsed / 1e6,
+        "writes-per-audio-second": calls / audio_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sentences", type=int, default=500)
+    parser.add_argument("--sentence-seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    audio = sentences(args.sentences, args.sentence_seconds)
+    silence = bytes(SAMPLE_RATE // 5 * 2)
+    results = {
+        "copying": bench(copying, audio, silence),
+        "direct": bench(direct, audio, silence),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifer: GPL-3.0-or-later
+#
+# CPU time per second of audio for producing 16 bit and float output:
+# converting model output to samples, and pitch shifting through the pitch
+# pipeline into /dev/null. Float output skips the int16 conversion and both
+# audioconverts around the pitch element.
+#
+# Run with the common and piper packages on the path:
+#   PYTHONPATH=providers/common:providers/piper python3 benchmarks/format_cpu.py
+
+import gi
+
+gi.require_version("Gst", "1.0")
+from gi.repository import GLib
+import argparse
+import json
+import os
+import threading
+from time import process_time
+
+import numpy as np
+
+from speech_provider_common.transport import PitchPipeline
+from speech_provider_piper.synth import SampleBuffer
+
+SAMPLE_RATE = 22050
+FORMATS = ["S16LE", "F32LE"]
+
+
+def sentences(count, seconds):
+    rng = np.random.default_rng(0)
+    return [
+        (rng.standard_normal(int(SAMPLE_RATE * seconds)) * 0.3).astype(np.float32)
+        for _ in range(count)
+    ]
+
+
+def conversion(audio, sample_format):
+    buffer = SampleBuffer()
+    start = process_time()
+    for sentence in audio:
+        buffer.convert(sentence.copy(), sample_format)
+    return process_time() - start
+
+
+def pitch(audio, sample_format, loop):
+    buffer = SampleBuffer()
+    samples = [buffer.convert(sentence.copy(), sample_format).copy() for sentence in audio]
+    pipeline = PitchPipeline(sample_format)
+    done = threading.Event()
+    pipeline.connect("done", lambda _pipeline: done.set())
+
+    def feed():
+        pipeline.start(SAMPLE_RATE)
+        for sentence in samples:
+            pipeline.write(sentence)
+        pipeline.close()
+
+    start = process_time()
+    pipeline.open(os.open(os.devnull, os.O_WRONLY), 1.2)
+    threading.Thread(target=feed).start()
+    context = loop.get_context()
+    while not done.is_set():
+        context.iteration(True)
+    elapsed = process_time() - start
+    pipeline.shutdown()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sentences", type=int, default=100)
+    parser.add_argument("--sentence-seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    audio = sentences(args.sentences, args.sentence_seconds)
+    audio_seconds = args.sentences * args.sentence_seconds
+    loop = GLib.MainLoop()
+    results = {
+        sample_format: {
+            "conversion-cpu-per-audio-second": conversion(audio, sample_format)
+            / audio_seconds,
+            "pitch-cpu-per-audio-second": pitch(audio, sample_format, loop)
+            / audio_seconds,
+        }
+        for sample_format in FORMATS
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# SPDX-License-Identifer: GPL-3.0-or-later
+#
+# Helpers for driving speech providers on a private session bus.
+
+from gi.repository import Gio, GLib
+from pathlib import Path
+import os
+import subprocess
+import sys
+from time import perf_counter, sleep
+
+ROOT = Path(__file__).resolve().parent.parent
+INTERFACE = "org.freedesktop.Speech.Provider"
+
+PROVIDERS = {
+    "piper": {
+        "name": "ai.piper.Speech.Provider",
+        "path": "/ai/piper/Speech/Provider",
+        "source": ROOT / "providers" / "piper",
+        "main": "from speech_provider_piper.main import main; "
+        "sys.exit(main(os.environ.get('PIPER_VOICES_DIR', '/app/share/piper/voices')))",
+    },
+    "mimic3": {
+        "name": "ai.mimic3.Speech.Provider",
+        "path": "/ai/mimic3/Speech/Provider",
+        "source": ROOT / "providers" / "mimic3",
+        "main": "from speech_provider_mimic3.main import main; sys.exit(main())",
+    },
+    # Speaks tones in the shared provider framework, for measuring the
+    # framework without models. STUB_ENGINE_REALTIME_FACTOR sets how long
+    # its synthesis pretends to take.
+    "stub": {
+        "name": "ai.stub.Speech.Provider",
+        "path": "/ai/stub/Speech/Provider",
+        "source": ROOT / "providers" / "common",
+        "main": "from speech_provider_common.stub import main; sys.exit(main())",
+    },
+}
+
+
+class PrivateBus(object):
+    """A dbus-daemon session bus that only lives as long as the benchmark."""
+
+    def __init__(self):
+        self._daemon = subprocess.Popen(
+            ["dbus-daemon", "--session", "--nofork", "--print-address=1"],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        self.address = self._daemon.stdout.readline().strip()
+        self.connection = Gio.DBusConnection.new_for_address_sync(
+            self.address,
+            Gio.DBusConnectionFlags.AUTHENTICATION_CLIENT
+            | Gio.DBusConnectionFlags.MESSAGE_BUS_CONNECTION,
+            None,
+            None,
+        )
+
+    def has_owner(self, name):
+        (has_owner,) = self.connection.call_sync(
+            "org.freedesktop.DBus",
+            "/org/freedesktop/DBus",
+            "org.freedesktop.DBus",
+            "NameHasOwner",
+            GLib.Variant("(s)", (name,)),
+            GLib.VariantType("(b)"),
+            Gio.DBusCallFlags.NONE,
+            -1,
+            None,
+        ).unpack()
+        return has_owner
+
+    def wait_for_name(self, name, timeout=60):
+        deadline = perf_counter() + timeout
+        while not self.has_owner(name):
+            if perf_counter() > deadline:
+                raise TimeoutError(f"{name} did not appear on the bus")
+            sleep(0.005)
+
+    def close(self):
+        self.connection.close_sync(None)
+        self._daemon.terminate()
+        self._daemon.wait()
+
+
+def launch_provider(bus, provider, state_dir, env=None, cache=False):
+    """
+    Starts a provider from the source tree, returns the process. It keeps
+    its caches and state in `state_dir` instead of the user's, and its
+    audio cache is off unless `cache` is set, so text is synthesized every
+    time it is requested.
+    """
+    info = PROVIDERS[provider]
+    environ = dict(os.environ)
+    if not cache:
+        environ["SPEECH_PROVIDER_AUDIO_CACHE_MEMORY_BYTES"] = "0"
+        environ["SPEECH_PROVIDER_AUDIO_CACHE_DISK_BYTES"] = "0"
+    environ.update(env or {})
+    environ["XDG_CACHE_HOME"] = os.path.join(state_dir, "cache")
+    environ["XDG_STATE_HOME"] = os.path.join(state_dir, "state")
+    environ["DBUS_SESSION_BUS_ADDRESS"] = bus.address
+    environ["KEEP_ALIVE"] = "1"
+    environ["PYTHONPATH"] = os.pathsep.join(
+        [str(info["source"]), str(ROOT / "providers" / "common")]
+        + [p for p in [environ.get("PYTHONPATH")] if p]
+    )
+    return subprocess.Popen(
+        [sys.executable, "-c", "import os, sys; " + info["main"]], env=environ
+    )
+
+
+def synthesize(bus, provider, text, voice_id, pitch=1.0, rate=1.0):
+    """
+    Synthesizes text and reads the audio back. Returns the time until the
+    first audio byte, the total time and the number of bytes received.
+    """
+    info = PROVIDERS[provider]
+    r, w = os.pipe()
+    start = perf_counter()
+    bus.connection.call_with_unix_fd_list_sync(
+        info["name"],
+        info["path"],
+        INTERFACE,
+        "Synthesize",
+        GLib.Variant("(hssddbs)", (0, text, voice_id, pitch, rate, False, "")),
+        None,
+        Gio.DBusCallFlags.NONE,
+        -1,
+        Gio.UnixFDList.new_from_array([w]),
+        None,
+    )
+    first_byte = None
+    size = 0
+    with os.fdopen(r, "rb", buffering=0) as rr:
+        while True:
+            data = rr.read(1 << 16)
+            if not data:
+                break
+            if first_byte is None:
+                first_byte = perf_counter() - start
+            size += len(data)
+    return first_byte, perf_counter() - start, size
+
+
+def voices(bus, provider):
+    info = PROVIDERS[provider]
+    (value,) = bus.connection.call_sync(
+        info["name"],
+        info["path"],
+        "org.freedesktop.DBus.Properties",
+        "Get",
+        GLib.Variant("(ss)", (INTERFACE, "Voices")),
+        GLib.VariantType("(v)"),
+        Gio.DBusCallFlags.NONE,
+        -1,
+        None,
+    ).unpack()
+    return value
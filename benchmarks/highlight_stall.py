@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifer: GPL-3.0-or-later
+#
+# Main loop stalls while highlighting spoken ranges in a large buffer.
+# Word and sentence events are fired much faster than real speech, through
+# the per-event highlighting spiel-it used to do and through Highlighter.
+# Reports the longest and mean gap between main loop iterations, and
+# between frames.
+#
+# Needs a display, run with spiel-it on the path:
+#   PYTHONPATH=spiel-it python3 benchmarks/highlight_stall.py
+
+import gi
+
+gi.require_version("Gtk", "4.0")
+gi.require_version("Pango", "1.0")
+from gi.repository import GLib, Gtk, Pango
+import argparse
+import json
+import re
+from time import perf_counter
+
+from spiel_it.highlight import Highlighter, WORD, SENTENCE
+
+
+class PerEventHighlighter(object):
+    """The highlighting spiel-it did before Highlighter."""
+
+    def __init__(self, text_view):
+        self.buffer = text_view.get_buffer()
+        self.buffer.create_tag(WORD, underline=Pango.Underline.SINGLE)
+        self.current_spoken_range = [None, None]
+
+    def highlight(self, layer, begin, end):
+        begin_iter, end_iter = self.current_spoken_range
+        if begin_iter is not None and end_iter is not None:
+            self.buffer.remove_tag_by_name(WORD, begin_iter, end_iter)
+        begin_iter = self.buffer.get_iter_at_offset(begin)
+        end_iter = self.buffer.get_iter_at_offset(end)
+        self.buffer.apply_tag_by_name(WORD, begin_iter, end_iter)
+        self.current_spoken_range = [begin_iter, end_iter]
+
+
+def document(length):
+    sentence = "The quick brown fox jumps over the lazy dog, again and again. "
+    return (sentence * (length // len(sentence) + 1))[:length]
+
+
+def events(text):
+    for sentence in re.finditer(r"[^.]+\.", text):
+        yield SENTENCE, sentence.start(), sentence.end()
+        for word in re.finditer(r"\w+", sentence.group()):
+            yield WORD, sentence.start() + word.start(), sentence.start() + word.end()
+
+
+class Gaps(object):
+    def __init__(self):
+        self.last = None
+        self.gaps = []
+
+    def mark(self):
+        now = perf_counter()
+        if self.last is not None:
+            self.gaps.append(now - self.last)
+        self.last = now
+
+    def summary(self):
+        if not self.gaps:
+            return None
+        return {
+            "max-ms": max(self.gaps) * 1000,
+            "mean-ms": sum(self.gaps) / len(self.gaps) * 1000,
+        }
+
+
+def run(app, highlighter_class, text, events_per_iteration):
+    window = Gtk.ApplicationWindow(application=app, default_width=800, default_height=600)
+    text_view = Gtk.TextView(wrap_mode=Gtk.WrapMode.WORD)
+    text_view.get_buffer().set_text(text)
+    scrolled = Gtk.ScrolledWindow(child=text_view)
+    window.set_child(scrolled)
+    window.present()
+
+    highlighter = highlighter_class(text_view)
+    pending = events(text)
+    loop_gaps = Gaps()
+    frame_gaps = Gaps()
+    result = {}
+
+    def on_frame(widget, frame_clock):
+        frame_gaps.mark()
+        return GLib.SOURCE_CONTINUE
+
+    def on_probe():
+        loop_gaps.mark()
+        return GLib.SOURCE_CONTINUE
+
+    def fire():
+        for _ in range(events_per_iteration):
+            event = next(pending, None)
+            if event is None:
+                result["elapsed"] = perf_counter() - start
+                GLib.source_remove(probe_id)
+                window.destroy()
+                return GLib.SOURCE_REMOVE
+            highlighter.highlight(*event)
+        return GLib.SOURCE_CONTINUE
+
+    text_view.add_tick_callback(on_frame)
+    probe_id = GLib.timeout_add(1, on_probe)
+    start = perf_counter()
+    GLib.idle_add(fire)
+    while "elapsed" not in result:
+        GLib.MainContext.default().iteration(True)
+
+    result["loop-gaps"] = loop_gaps.summary()
+    result["frame-gaps"] = frame_gaps.summary()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--characters", type=int, default=100_000)
+    parser.add_argument("--events-per-iteration", type=int, default=10)
+    args = parser.parse_args()
+
+    text = document(args.characters)
+    results = {}
+    app = Gtk.Application()
+
+    def on_activate(app):
+        app.hold()
+        for name, highlighter_class in [
+            ("per-event", PerEventHighlighter),
+            ("highlighter", Highlighter),
+        ]:
+            results[name] = run(
+                app, highlighter_class, text, args.events_per_iteration
+            )
+        app.release()
+
+    app.connect("activate", on_activate)
+    app.run([])
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifer: GPL-3.0-or-later
+#
+# Load test of a provider on a private session bus. Either keeps a fixed
+# number of clients busy (--concurrency), or sends requests at a fixed
+# average rate regardless of how fast they complete (--rate). Utterances
+# are drawn from a mix of lengths, and numbered so none of them repeats.
+# The provider's audio cache is off unless --cache is given, and its caches
+# live in a temporary directory. Reports time to first audio byte, total
+# synthesis time and real time factor percentiles.
+#
+#   python3 benchmarks/load.py piper --voice en_US-lessac-medium \
+#       --concurrency 4 --requests 100 --lengths short:2,long:1
+#   STUB_ENGINE_REALTIME_FACTOR=0.2 python3 benchmarks/load.py stub \
+#       --concurrency 8
+
+import argparse
+import json
+import random
+import re
+import tempfile
+import threading
+from time import perf_counter, sleep
+
+from harness import PROVIDERS, PrivateBus, launch_provider, synthesize, voices
+
+SENTENCES = [
+    "The quick brown fox jumps over the lazy dog.",
+    "She sells sea shells by the sea shore.",
+    "A journey of a thousand miles begins with a single step.",
+    "It was the best of times, it was the worst of times.",
+    "All happy families are alike, each unhappy family is unhappy in its own way.",
+    "The library closes early on Sundays, so plan your visit accordingly.",
+    "Please remember to water the plants while I am away next week.",
+    "Turn left at the second light and the station will be on your right.",
+]
+
+# Number of sentences in an utterance of each length.
+LENGTHS = {
+    "word": 0,
+    "short": 1,
+    "medium": 3,
+    "long": 10,
+}
+
+
+def utterance(rng, length, sequence):
+    # The sequence number keeps the provider from reusing earlier audio.
+    count = LENGTHS[length]
+    if not count:
+        return f"{sequence} {rng.choice(SENTENCES).split()[1]}"
+    return f"{sequence}. " + " ".join(rng.choice(SENTENCES) for _ in range(count))
+
+
+def parse_lengths(spec):
+    weights = {}
+    for item in spec.split(","):
+        name, _, weight = item.partition(":")
+        if name not in LENGTHS:
+            raise argparse.ArgumentTypeError(f"unknown length {name}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+# Bytes of each sample format the providers output
+SAMPLE_SIZES = {"S16LE": 2, "F32LE": 4}
+
+
+def bytes_per_second(bus, provider, voice_id):
+    for _name, identifier, output_format, _features, _languages in voices(
+        bus, provider
+    ):
+        if identifier == voice_id or not voice_id:
+            rate = int(re.search(r"rate=(\d+)", output_format).group(1))
+            sample_format = re.search(r"format=(\w+)", output_format).group(1)
+            return rate * SAMPLE_SIZES[sample_format]
+    raise ValueError(f"no voice {voice_id}")
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+
+    def at(p):
+        return values[min(len(values) - 1, int(len(values) * p))]
+
+    return {
+        "min": values[0],
+        "p50": at(0.5),
+        "p95": at(0.95),
+        "p99": at(0.99),
+        "max": values[-1],
+        "mean": sum(values) / len(values),
+    }
+
+
+class Load(object):
+    def __init__(self, bus, provider, voice_id, bytes_per_second, lengths, seed):
+        self.bus = bus
+        self.provider = provider
+        self.voice_id = voice_id
+        self.bytes_per_second = bytes_per_second
+        self.lengths = lengths
+        self._rng = random.Random(seed)
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self.results = []
+        self.failures = 0
+
+    def next_utterance(self):
+        with self._lock:
+            length = self._rng.choices(
+                list(self.lengths), weights=list(self.lengths.values())
+            )[0]
+            self._sequence += 1
+            return length, utterance(self._rng, length, self._sequence)
+
+    def run_one(self):
+        length, text = self.next_utterance()
+        try:
+            first_byte, total, size = synthesize(
+                self.bus, self.provider, text, self.voice_id
+            )
+        except Exception as e:
+            print("WARNING: request failed:", e)
+            with self._lock:
+                self.failures += 1
+            return
+        audio_seconds = size / self.bytes_per_second
+        with self._lock:
+            self.results.append(
+                {
+                    "length": length,
+                    "first-byte": first_byte,
+                    "total": total,
+                    "rtf": total / audio_seconds if audio_seconds else None,
+                }
+            )
+
+    def closed_loop(self, concurrency, requests):
+        remaining = iter(range(requests))
+        lock = threading.Lock()
+
+        def client():
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+                self.run_one()
+
+        clients = [threading.Thread(target=client) for _ in range(concurrency)]
+        for c in clients:
+            c.start()
+        for c in clients:
+            c.join()
+
+    def open_loop(self, rate, requests):
+        # Poisson arrivals, each request gets its own client.
+        clients = []
+        next_at = perf_counter()
+        for _ in range(requests):
+            next_at += self._rng.expovariate(rate)
+            sleep(max(0, next_at - perf_counter()))
+            c = threading.Thread(target=self.run_one)
+            c.start()
+            clients.append(c)
+        for c in clients:
+            c.join()
+
+    def report(self, elapsed):
+        def summary(results):
+            return {
+                "requests": len(results),
+                "first-byte": percentiles(
+                    [r["first-byte"] for r in results if r["first-byte"] is not None]
+                ),
+                "total": percentiles([r["total"] for r in results]),
+                "rtf": percentiles([r["rtf"] for r in results if r["rtf"]]),
+            }
+
+        report = summary(self.results)
+        report["failures"] = self.failures
+        report["elapsed"] = elapsed
+        report["throughput"] = len(self.results) / elapsed
+        report["by-length"] = {
+            length: summary([r for r in self.results if r["length"] == length])
+            for length in self.lengths
+        }
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("provider", choices=PROVIDERS.keys())
+    parser.add_argument("--voice", default="")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--concurrency", type=int, default=1)
+    mode.add_argument("--rate", type=float, help="requests per second")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--lengths", type=parse_lengths, default="short:2,medium:1")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--cache", action="store_true", help="keep the provider's audio cache on"
+    )
+    args = parser.parse_args()
+
+    state_dir = tempfile.TemporaryDirectory(prefix="speech-provider-load-")
+    bus = PrivateBus()
+    try:
+        process = launch_provider(bus, args.provider, state_dir.name, cache=args.cache)
+        try:
+            bus.wait_for_name(PROVIDERS[args.provider]["name"])
+            load = Load(
+                bus,
+                args.provider,
+                args.voice,
+                bytes_per_second(bus, args.provider, args.voice),
+                args.lengths,
+                args.seed,
+            )
+            # Get model loading out of the measurements.
+            for _ in range(args.warmup):
+                load.run_one()
+            load.results = []
+            load.failures = 0
+
+            start = perf_counter()
+            if args.rate:
+                load.open_loop(args.rate, args.requests)
+            else:
+                load.closed_loop(args.concurrency, args.requests)
+            report = load.report(perf_counter() - start)
+            report["provider"] = args.provider
+            report["voice"] = args.voice
+            report["concurrency"] = None if args.rate else args.concurrency
+            report["rate"] = args.rate
+            report["cache"] = args.cache
+            print(json.dumps(report, indent=2))
+        finally:
+            process.terminate()
+            process.wait()
+    finally:
+        bus.close()
+        state_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
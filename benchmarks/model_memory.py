@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifer: GPL-3.0-or-later
+#
+# Load time and memory of Piper voices, loaded privately and through the
+# shared model format. Each load happens in a fresh process, a few of them
+# at once, so shared pages show up as a proportional set size below the
+# resident size.
+#
+#   PYTHONPATH=providers/common:providers/piper \
+#       python3 benchmarks/model_memory.py /app/share/piper/voices
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+LOADER = """
+import json, os, sys
+from pathlib import Path
+from time import perf_counter
+
+def memory():
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    return fields
+
+from speech_provider_piper.voice_cache import VoiceCache
+import onnxruntime, piper
+
+cache = VoiceCache(Path(sys.argv[1]))
+before = memory()
+start = perf_counter()
+cache.acquire(sys.argv[2])
+load_time = perf_counter() - start
+after = memory()
+print(json.dumps({
+    "load-time": load_time,
+    "rss": after["Rss"] - before["Rss"],
+    "pss": after["Pss"] - before["Pss"],
+    "private": after["Private_Clean"] + after["Private_Dirty"]
+    - before["Private_Clean"] - before["Private_Dirty"],
+}), flush=True)
+# Stay alive until all the loaders have measured.
+sys.stdin.read()
+"""
+
+
+def load(voices_dir, voice_id, shared, processes):
+    env = dict(os.environ)
+    env.pop("PIPER_SHARED_MODELS", None)
+    if shared:
+        env["PIPER_SHARED_MODELS"] = "1"
+    results = []
+    loaders = []
+    try:
+        for _ in range(processes):
+            loader = subprocess.Popen(
+                [sys.executable, "-c", LOADER, str(voices_dir), voice_id],
+                env=env,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                text=True,
+            )
+            loaders.append(loader)
+            # One at a time, so later ones find the earlier ones' pages.
+            results.append(json.loads(loader.stdout.readline()))
+    finally:
+        for loader in loaders:
+            loader.stdin.close()
+            loader.wait()
+    return {
+        "first-load-time": results[0]["load-time"],
+        "later-load-time": min(r["load-time"] for r in results[1:])
+        if len(results) > 1
+        else None,
+        # Measured with all the processes alive
+        "rss": results[-1]["rss"],
+        "pss": results[-1]["pss"],
+        "private": results[-1]["private"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("voices_dir", type=Path)
+    parser.add_argument("--voice", action="append")
+    parser.add_argument("--processes", type=int, default=3)
+    args = parser.parse_args()
+
+    voice_ids = args.voice or sorted(p.stem for p in args.voices_dir.glob("*.onnx"))
+    results = {
+        voice_id: {
+            "private": load(args.voices_dir, voice_id, False, args.processes),
+            "shared": load(args.voices_dir, voice_id, True, args.processes),
+        }
+        for voice_id in voice_ids
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifer: GPL-3.0-or-later
+#
+# Time per sentence spent phonemizing and running the model for a Piper
+# voice, and the phonemize step again once the phoneme cache holds the
+# sentences, to show what repeated text saves.
+#
+#   PYTHONPATH=providers/common:providers/piper \
+#       python3 benchmarks/phonemize_cost.py /app/share/piper/voices en_US-lessac-medium
+
+import argparse
+import json
+import statistics
+from pathlib import Path
+from time import perf_counter
+
+from speech_provider_common.phoneme_cache import PhonemeCache
+from speech_provider_piper.synth import phonemize, infer
+from speech_provider_piper.voice_cache import VoiceCache
+
+SENTENCES = [
+    "Your meeting starts in five minutes.",
+    "The quick brown fox jumps over the lazy dog.",
+    "Press enter to continue, or escape to cancel.",
+    "Battery low, please connect your charger.",
+    "A new message has arrived from the build server, "
+    "and three of the tests that were failing yesterday now pass.",
+]
+
+
+def median_ms(times):
+    return statistics.median(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("voices_dir", type=Path)
+    parser.add_argument("voice")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    voice = VoiceCache(args.voices_dir).acquire(args.voice)
+    cache = PhonemeCache("phonemize-cost", persist=False)
+    phonemize_times = []
+    cached_times = []
+    infer_times = []
+    for _ in range(args.rounds):
+        for sentence in SENTENCES:
+            start = perf_counter()
+            ids_list = [voice.phonemes_to_ids(p) for p in phonemize(voice, sentence)]
+            phonemize_times.append(perf_counter() - start)
+            cache.put(args.voice, sentence, ids_list)
+
+            start = perf_counter()
+            ids_list = cache.get(args.voice, sentence)
+            cached_times.append(perf_counter() - start)
+
+            start = perf_counter()
+            for phoneme_ids in ids_list:
+                infer(voice, phoneme_ids, voice.config.length_scale)
+            infer_times.append(perf_counter() - start)
+
+    phonemize_ms = median_ms(phonemize_times)
+    infer_ms = median_ms(infer_times)
+    results = {
+        "phonemize-ms": phonemize_ms,
+        "cached-phonemize-ms": median_ms(cached_times),
+        "inference-ms": infer_ms,
+        "phonemize-share": phonemize_ms / (phonemize_ms + infer_ms),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
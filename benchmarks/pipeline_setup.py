@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifer: GPL-3.0-or-later
+#
+# Per-request audio output setup cost: the original fdsrc pipeline that is
+# rebuilt for every request, the reusable appsrc pitch pipeline and the
+# direct fd path. Each request pushes a short burst of silence into
+# /dev/null and waits for the output to be done.
+#
+# Run with the common package on the path:
+#   PYTHONPATH=providers/common python3 benchmarks/pipeline_setup.py
+
+import gi
+
+gi.require_version("Gst", "1.0")
+from gi.repository import Gst, GLib
+import argparse
+import json
+import os
+import threading
+from time import perf_counter
+
+from speech_provider_common.transport import DirectOutput, PitchPipeline
+
+SAMPLE_RATE = 22050
+AUDIO = bytes(SAMPLE_RATE // 10 * 2)  # 100ms of 16 bit silence
+
+
+class RebuiltPipeline(object):
+    """The fdsrc pipeline as it was before outputs were reusable."""
+
+    def __init__(self):
+        self.pipeline = Gst.Pipeline.new("test-pipeline")
+        self.source = None
+        self.parse = Gst.ElementFactory.make("rawaudioparse", "parse")
+        self.convert = Gst.ElementFactory.make("audioconvert", "convert")
+        self.pitch = Gst.ElementFactory.make("pitch", "pitch")
+        self.convert2 = Gst.ElementFactory.make("audioconvert", "convert2")
+        self.caps_filter = Gst.ElementFactory.make("capsfilter", "filter")
+        self.sink = Gst.ElementFactory.make("fdsink", "sink")
+        self.sink.set_property("sync", False)
+        elements = [
+            self.parse,
+            self.convert,
+            self.pitch,
+            self.convert2,
+            self.caps_filter,
+            self.sink,
+        ]
+        for el in elements:
+            self.pipeline.add(el)
+        for index in range(1, len(elements)):
+            elements[index - 1].link(elements[index])
+        self.parse.set_property("num-channels", 1)
+        self.parse.set_property("sample-rate", SAMPLE_RATE)
+        self.caps_filter.set_property(
+            "caps",
+            Gst.caps_from_string(
+                f"audio/x-raw,format=S16LE,channels=1,rate={SAMPLE_RATE}"
+            ),
+        )
+        self.done = None
+        bus = self.pipeline.get_bus()
+        bus.add_signal_watch()
+        bus.connect("message::error", self._reset)
+        bus.connect("message::eos", self._reset)
+
+    def run(self, fd, done):
+        self.done = done
+        self.sink.set_property("fd", fd)
+        self.source = Gst.ElementFactory.make("fdsrc", "source")
+        self.pipeline.add(self.source)
+        self.source.link(self.parse)
+        self.pitch.set_property("pitch", 1.2)
+        r, w = os.pipe()
+        self.source.set_property("fd", r)
+
+        def write():
+            with os.fdopen(w, "wb", buffering=0) as ww:
+                ww.write(AUDIO)
+
+        threading.Thread(target=write).start()
+        self.pipeline.set_state(Gst.State.PLAYING)
+
+    def _reset(self, bus, msg):
+        os.close(self.source.get_property("fd"))
+        os.close(self.sink.get_property("fd"))
+        self.source.set_state(Gst.State.NULL)
+        self.source.unlink(self.parse)
+        self.pipeline.remove(self.source)
+        self.source = None
+        self.pipeline.set_state(Gst.State.READY)
+        self.done()
+
+
+def run_output(output, done):
+    handler = output.connect("done", lambda *args: done())
+
+    def write():
+        output.start(SAMPLE_RATE)
+        output.write(AUDIO)
+        output.close()
+
+    threading.Thread(target=write).start()
+    return handler
+
+
+def bench(name, requests, loop):
+    rebuilt = RebuiltPipeline()
+    pitch_pipeline = PitchPipeline()
+    timings = []
+    state = {"remaining": requests, "start": 0}
+
+    def next_request():
+        if not state["remaining"]:
+            loop.quit()
+            return False
+        state["remaining"] -= 1
+        fd = os.open(os.devnull, os.O_WRONLY)
+        state["start"] = perf_counter()
+        if name == "rebuilt":
+            rebuilt.run(fd, finished)
+        elif name == "pitch":
+            if "handler" in state:
+                pitch_pipeline.disconnect(state.pop("handler"))
+            pitch_pipeline.open(fd, 1.2)
+            state["handler"] = run_output(pitch_pipeline, finished)
+        else:
+            run_output(DirectOutput(fd), finished)
+        return False
+
+    def finished():
+        timings.append(perf_counter() - state["start"])
+        GLib.idle_add(next_request)
+
+    GLib.idle_add(next_request)
+    loop.run()
+    timings.sort()
+    return {
+        "requests": len(timings),
+        "mean-ms": sum(timings) / len(timings) * 1000,
+        "p50-ms": timings[len(timings) // 2] * 1000,
+        "p95-ms": timings[int(len(timings) * 0.95)] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    Gst.init(None)
+    loop = GLib.MainLoop()
+    results = {
+        name: bench(name, args.requests, loop)
+        for name in ("rebuilt", "pitch", "direct")
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
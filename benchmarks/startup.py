@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifer: GPL-3.0-or-later
+#
+# Cold start of a provider: time from spawning the process until it owns
+# its bus name, and until the first audio byte of a first utterance. The
+# runs share caches in a temporary directory, so the first run starts with
+# none and later ones with what it left behind.
+#
+#   python3 benchmarks/startup.py piper --voice en_US-lessac-medium
+
+import argparse
+import json
+import tempfile
+from time import perf_counter
+
+from harness import PROVIDERS, PrivateBus, launch_provider, synthesize
+
+
+def measure(provider, voice_id, text, state_dir):
+    bus = PrivateBus()
+    try:
+        start = perf_counter()
+        process = launch_provider(bus, provider, state_dir)
+        try:
+            bus.wait_for_name(PROVIDERS[provider]["name"])
+            name_owned = perf_counter() - start
+            first_byte, total, _size = synthesize(bus, provider, text, voice_id)
+            return {
+                "name-owned": name_owned,
+                "first-audio-byte": name_owned + first_byte,
+                "first-utterance-done": name_owned + total,
+            }
+        finally:
+            process.terminate()
+            process.wait()
+    finally:
+        bus.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("provider", choices=PROVIDERS.keys())
+    parser.add_argument("--voice", default="")
+    parser.add_argument("--text", default="Hello world.")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="speech-provider-startup-") as state_dir:
+        runs = [
+            measure(args.provider, args.voice, args.text, state_dir)
+            for _ in range(args.runs)
+        ]
+    results = {
+        key: {
+            "min": min(run[key] for run in runs),
+            "mean": sum(run[key] for run in runs) / len(runs),
+        }
+        for key in runs[0]
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+# SPDX-License-Identifer: GPL-3.0-or-later
+
+from collections import OrderedDict
+from gi.repository import GLib
+from pathlib import Path
+import hashlib
+import os
+import struct
+import tempfile
+import threading
+
+DEFAULT_MEMORY_BYTES = 16 * 1024 * 1024
+DEFAULT_DISK_BYTES = 128 * 1024 * 1024
+DEFAULT_ENTRY_BYTES = 1024 * 1024  # About 20 seconds of 16 bit audio at 22khz
+
+# Files start with the sample rate of the audio that follows.
+_HEADER = struct.Struct("<I")
+
+
+def cache_key(*parts):
+    text = " ".join(str(parts[-1]).split())
+    key = "\0".join([str(p) for p in parts[:-1]] + [text])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class AudioRecorder(object):
+    """Collects the audio of a synthesis for storing it once it completes."""
+
+    def __init__(self, cache, key, sample_rate):
+        self._cache = cache
+        self._key = key
+        self._sample_rate = sample_rate
+        # Nothing is recorded without a key
+        self._chunks = [] if key else None
+        self._size = 0
+
+    def append(self, audio):
+        if self._chunks is None:
+            return
+        # Take a copy, the caller may be reusing its buffer.
+        audio_bytes = bytes(audio)
+        self._size += len(audio_bytes)
+        if self._size > self._cache.max_entry_bytes:
+            # Too long to be worth caching
+            self._chunks = None
+        else:
+            self._chunks.append(audio_bytes)
+
+    def commit(self):
+        if self._chunks:
+            self._cache.put(self._key, self._sample_rate, b"".join(self._chunks))
+        self._chunks = None
+
+
+class AudioCache(object):
+    """
+    Synthesized audio keyed by everything that went into making it.
+
+    Recent entries are kept in memory, all of them are kept on disk under
+    the user cache directory and read back into memory when used. Both
+    tiers are bounded in size and drop their least recently used entries.
+    A None key is never cached.
+    """
+
+    def __init__(
+        self,
+        name,
+        memory_bytes=DEFAULT_MEMORY_BYTES,
+        disk_bytes=DEFAULT_DISK_BYTES,
+        max_entry_bytes=DEFAULT_ENTRY_BYTES,
+    ):
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._disk = OrderedDict()
+        self._disk_size = 0
+        self._dir = Path(GLib.get_user_cache_dir()) / name / "audio"
+        if self.disk_bytes:
+            self._dir.mkdir(parents=True, exist_ok=True)
+            self._scan_disk()
+
+    def _scan_disk(self):
+        # Left by writes that didn't complete
+        for path in self._dir.glob("*.tmp"):
+            path.unlink(missing_ok=True)
+        entries = []
+        for path in self._dir.glob("*.pcm"):
+            st = path.stat()
+            entries.append((st.st_atime, path.stem, st.st_size))
+        for _atime, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_size += size
+        self._evict_disk()
+
+    def _path(self, key):
+        return self._dir / f"{key}.pcm"
+
+    def get(self, key):
+        """Returns a (sample_rate, audio) tuple or None."""
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry
+
+            if key not in self._disk:
+                self.misses += 1
+                return None
+            self._disk.move_to_end(key)
+
+        try:
+            with open(self._path(key), "rb") as f:
+                header = f.read(_HEADER.size)
+                audio = f.read()
+            os.utime(self._path(key))
+            (sample_rate,) = _HEADER.unpack(header)
+        except (OSError, struct.error):
+            with self._lock:
+                self._forget_disk(key)
+                self.misses += 1
+            return None
+
+        entry = (sample_rate, audio)
+        with self._lock:
+            self.hits += 1
+            self._put_memory(key, entry)
+        return entry
+
+    def put(self, key, sample_rate, audio_bytes):
+        if key is None:
+            return
+        with self._lock:
+            self._put_memory(key, (sample_rate, audio_bytes))
+            if not self.disk_bytes or key in self._disk:
+                return
+
+        # Other threads may be writing the same entry.
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self._dir)
+            with open(fd, "wb") as f:
+                f.write(_HEADER.pack(sample_rate))
+                f.write(audio_bytes)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            print("WARNING: failed to write audio cache entry:", e)
+            if tmp_path:
+                Path(tmp_path).unlink(missing_ok=True)
+            return
+
+        with self._lock:
+            if key in self._disk:
+                return
+            size = _HEADER.size + len(audio_bytes)
+            self._disk[key] = size
+            self._disk_size += size
+            self._evict_disk()
+
+    def recorder(self, key, sample_rate):
+        return AudioRecorder(self, key, sample_rate)
+
+    def _put_memory(self, key, entry):
+        if key in self._memory:
+            return
+        self._memory[key] = entry
+        self._memory_size += len(entry[1])
+        while self._memory_size > self.memory_bytes:
+            _key, (_sample_rate, audio) = self._memory.popitem(last=False)
+            self._memory_size -= len(audio)
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+
+    def _forget_disk(self, key):
+        self._disk_size -= self._disk.pop(key, 0)
+
+    def _evict_disk(self):
+        while self._disk_size > self.disk_bytes:
+            key = next(iter(self._disk))
+            try:
+                self._path(key).unlink()
+            except OSError:
+                pass
+            self._forget_disk(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory-bytes": self._memory_size,
+                "disk-bytes": self._disk_size,
+            }
@@ -0,0 +1,319 @@
+# SPDX-License-Identifer: GPL-3.0-or-later
+#
+# Conformance and performance checks of an engine running in the provider
+# framework, calling the provider directly instead of over the bus. Every
+# engine is expected to pass them, the stub engine is checked by default:
+#
+#   python3 -m speech_provider_common.conformance
+#   PYTHONPATH=providers/common:providers/piper \
+#       python3 -m speech_provider_common.conformance \
+#       --engine speech_provider_piper.engine:PiperEngine \
+#       --engine-arg /app/share/piper/voices --voice en_US-lessac-medium
+#
+# Results are printed as JSON, the exit status is 1 if a check failed.
+
+from gi.repository import GLib
+import argparse
+import importlib
+import json
+import os
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+from time import perf_counter
+from .provider import SpeechProvider
+
+TIMEOUT_SECONDS = 120
+SENTENCE = "The quick brown fox jumps over the lazy dog."
+SHORT_SENTENCE = "Yes."
+CONCURRENT_REQUESTS = 8
+# How much the length of a sentence's audio may vary between syntheses,
+# models with noisy durations don't say a sentence exactly alike twice.
+LENGTH_TOLERANCE = 0.2
+PERF_REQUESTS = 5
+
+
+class CheckFailed(Exception):
+    pass
+
+
+def expect(condition, message):
+    if not condition:
+        raise CheckFailed(message)
+
+
+class Client(object):
+    """Reads the audio of one Synthesize call from its pipe."""
+
+    def __init__(self, provider, text, voice_id, **kwargs):
+        self.audio = bytearray()
+        self.done = False
+        self.first_audio = None
+        self.elapsed = None
+        self._close_after = kwargs.pop("close_after", None)
+        read_fd, write_fd = os.pipe()
+        self._fd = read_fd
+        self._start = perf_counter()
+        GLib.io_add_watch(
+            read_fd,
+            GLib.PRIORITY_DEFAULT,
+            GLib.IOCondition.IN | GLib.IOCondition.HUP | GLib.IOCondition.ERR,
+            self._on_readable,
+        )
+        # The provider owns the write end, like the copy it gets over the bus.
+        provider.Synthesize(
+            write_fd,
+            text,
+            voice_id,
+            kwargs.get("pitch", 1.0),
+            kwargs.get("rate", 1.0),
+            kwargs.get("is_ssml", False),
+            kwargs.get("language", ""),
+        )
+
+    def _on_readable(self, fd, condition):
+        chunk = os.read(fd, 65536)
+        if chunk and self.first_audio is None:
+            self.first_audio = perf_counter() - self._start
+        self.audio += chunk
+        if chunk and not (self._close_after and len(self.audio) >= self._close_after):
+            return True
+        self.elapsed = perf_counter() - self._start
+        self.done = True
+        os.close(fd)
+        return False
+
+
+class Conformance(object):
+    def __init__(self, engine, voice_id):
+        self.loop = GLib.MainLoop()
+        self.engine = engine
+        self.provider = SpeechProvider(self.loop, engine)
+        self.voice_id = voice_id
+        self.sample_rate = None
+
+    def run_until(self, condition):
+        context = self.loop.get_context()
+        deadline = perf_counter() + TIMEOUT_SECONDS
+        while not condition():
+            expect(perf_counter() < deadline, "timed out")
+            context.iteration(True)
+
+    def speak(self, text, voice_id=None, **kwargs):
+        client = Client(
+            self.provider,
+            text,
+            self.voice_id if voice_id is None else voice_id,
+            **kwargs,
+        )
+        self.run_until(lambda: client.done)
+        # Done once the worker is back, so stats are up to date.
+        self.run_until(lambda: self.provider.scheduler.is_idle)
+        return client
+
+    def stat(self, component, name):
+        return self.provider.collect_stats()[component][name]
+
+    def seconds(self, audio):
+        return len(audio) / (self.sample_rate * self.engine.sample_size)
+
+    def check_voices(self):
+        voices = self.provider.Voices
+        expect(voices, "no voices")
+        for voice in voices:
+            name, voice_id, audio_format, features, languages = voice
+            expect(isinstance(name, str) and isinstance(voice_id, str), f"bad {voice}")
+            expect(isinstance(features, int), f"bad features in {voice}")
+            expect(
+                f"format={self.engine.sample_format}" in audio_format,
+                f"format of {voice_id} is {audio_format}",
+            )
+            expect(languages and all(isinstance(l, str) for l in languages), f"bad {voice}")
+        formats = {voice[1]: voice[2] for voice in voices}
+        if not self.voice_id:
+            self.voice_id = voices[0][1]
+        expect(self.voice_id in formats, f"no voice {self.voice_id}")
+        self.sample_rate = int(re.search(r"rate=(\d+)", formats[self.voice_id])[1])
+
+    def check_audio(self):
+        completed = self.stat("scheduler", "completed")
+        client = self.speak(SENTENCE)
+        expect(client.audio, "no audio")
+        expect(len(client.audio) % self.engine.sample_size == 0, "partial samples")
+        expect(self.stat("scheduler", "completed") == completed + 1, "not completed")
+
+    def check_cache(self):
+        text = "Cached. " + SENTENCE
+        first = self.speak(text)
+        hits = self.stat("audio-cache", "hits")
+        second = self.speak(text)
+        expect(self.stat("audio-cache", "hits") == hits + 1, "not served from cache")
+        expect(first.audio == second.audio, "cached audio differs")
+
+    def check_ssml_break(self):
+        client = self.speak(
+            '<speak>One.<break time="1s"/>Two.</speak>', is_ssml=True
+        )
+        expect(client.audio, "no audio")
+        silence = b"\0" * int(0.9 * self.sample_rate * self.engine.sample_size)
+        expect(silence in client.audio, "no silence for the break")
+
+    def check_language(self):
+        language = next(
+            voice[4][0] for voice in self.provider.Voices if voice[1] == self.voice_id
+        )
+        client = self.speak(SENTENCE, voice_id="", language=language)
+        expect(client.audio, f"no audio for language {language}")
+
+    def check_pitch(self):
+        client = self.speak(SENTENCE, pitch=1.5)
+        expect(client.audio, "no pitch shifted audio")
+        # Pitch shifted output doesn't fail writes when the client goes away,
+        # synthesis only stops on the request being cancelled.
+        self._cancel("Pitched. ", pitch=1.5)
+
+    def _cancel(self, prefix, **kwargs):
+        text = prefix + " ".join([SENTENCE] * 20)
+        cancelled = self.stat("scheduler", "cancelled-in-flight")
+        # Long enough to be stopped part way, and cached if it weren't.
+        cache = self.provider.audio_cache
+        max_entry_bytes = cache.max_entry_bytes
+        cache.max_entry_bytes = 1 << 30
+        try:
+            client = self.speak(text, close_after=self.engine.sample_size, **kwargs)
+            expect(client.audio, "no audio before cancelling")
+            expect(
+                self.stat("scheduler", "cancelled-in-flight") == cancelled + 1,
+                "synthesis not stopped",
+            )
+            hits = self.stat("audio-cache", "hits")
+            self.speak(text, **kwargs)
+            expect(self.stat("audio-cache", "hits") == hits, "cancelled audio cached")
+        finally:
+            cache.max_entry_bytes = max_entry_bytes
+
+    def check_cancel(self):
+        self._cancel("")
+
+    def _speak_together(self, texts):
+        clients = [Client(self.provider, text, self.voice_id) for text in texts]
+        self.run_until(lambda: all(client.done for client in clients))
+        self.run_until(lambda: self.provider.scheduler.is_idle)
+        expect(all(client.audio for client in clients), "request without audio")
+        return clients
+
+    def _burst(self, tag):
+        return self._speak_together(
+            [f"{tag} {i}. {SENTENCE}" for i in range(CONCURRENT_REQUESTS)]
+        )
+
+    def check_batching(self):
+        # A sentence sounds the same alone and synthesized along with longer
+        # ones, which engines may batch it with.
+        cache = self.provider.audio_cache
+        cache_bytes = cache.memory_bytes, cache.disk_bytes
+        cache.memory_bytes = cache.disk_bytes = 0
+        try:
+            alone = self.speak(SHORT_SENTENCE).audio
+            together = self._speak_together(
+                [SHORT_SENTENCE] + [SENTENCE] * (CONCURRENT_REQUESTS - 1)
+            )[0].audio
+        finally:
+            cache.memory_bytes, cache.disk_bytes = cache_bytes
+        expect(
+            abs(len(together) - len(alone)) <= LENGTH_TOLERANCE * len(alone),
+            f"{len(alone)} bytes of audio alone, {len(together)} together",
+        )
+
+    def check_concurrency(self):
+        self._burst("First")
+        threads = threading.active_count()
+        fds = len(os.listdir("/proc/self/fd"))
+        self._burst("Second")
+        expect(threading.active_count() <= threads, "threads grew between bursts")
+        expect(len(os.listdir("/proc/self/fd")) <= fds, "fds grew between bursts")
+
+    def perf(self):
+        latencies = []
+        factors = []
+        for i in range(PERF_REQUESTS):
+            client = self.speak(f"Request {i}. {SENTENCE}")
+            latencies.append(client.first_audio)
+            factors.append(client.elapsed / self.seconds(client.audio))
+        start = perf_counter()
+        clients = self._burst("Burst")
+        elapsed = perf_counter() - start
+        audio_seconds = sum(self.seconds(client.audio) for client in clients)
+        return {
+            "median-first-audio-ms": statistics.median(latencies) * 1000,
+            "median-realtime-factor": statistics.median(factors),
+            "concurrent-audio-seconds-per-second": audio_seconds / elapsed,
+        }
+
+    def run(self, skip=()):
+        names = [
+            "voices",
+            "audio",
+            "cache",
+            "ssml_break",
+            "language",
+            "pitch",
+            "cancel",
+            "batching",
+            "concurrency",
+        ]
+        results = {"engine": self.engine.name, "checks": {}}
+        for name in names:
+            if name in skip:
+                results["checks"][name] = "skipped"
+                continue
+            try:
+                getattr(self, f"check_{name}")()
+                results["checks"][name] = "ok"
+            except Exception as e:
+                results["checks"][name] = f"FAILED: {e}"
+                if name == "voices":
+                    break
+        if results["checks"].get("audio") == "ok":
+            try:
+                results["perf"] = self.perf()
+            except Exception as e:
+                results["perf"] = f"FAILED: {e}"
+        self.provider.executor.shutdown()
+        return results
+
+
+def load_engine(spec, args):
+    module_name, _, class_name = spec.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)(*args)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--engine", default="speech_provider_common.stub:StubEngine", help="module:Class"
+    )
+    parser.add_argument("--engine-arg", action="append", default=[])
+    parser.add_argument("--voice", default="", help="defaults to the first voice")
+    parser.add_argument("--skip", action="append", default=[])
+    args = parser.parse_args(argv)
+
+    # Start from empty caches, and leave the user's alone.
+    state_dir = tempfile.mkdtemp(prefix="speech-provider-conformance-")
+    os.environ["XDG_CACHE_HOME"] = os.path.join(state_dir, "cache")
+    os.environ["XDG_STATE_HOME"] = os.path.join(state_dir, "state")
+    try:
+        engine = load_engine(args.engine, args.engine_arg)
+        results = Conformance(engine, args.voice).run(args.skip)
+    finally:
+        shutil.rmtree(state_dir, ignore_errors=True)
+    print(json.dumps(results, indent=2))
+    failed = any(str(result).startswith("FAILED") for result in results["checks"].values())
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
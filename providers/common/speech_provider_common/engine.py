@@ -0,0 +1,83 @@
+# SPDX-License-Identifer: GPL-3.0-or-later
+
+from .phoneme_cache import PhonemeCache
+
+
+class Engine(object):
+    """
+    A speech synthesizer plugged into `SpeechProvider`, which takes care of
+    scheduling, caching, SSML, audio output and stats around it.
+
+    Engines load voices and turn a segment of text into PCM chunks. Their
+    methods may be called from any synthesis thread, and concurrently for
+    different requests.
+    """
+
+    # Short name used for cache directories, threads and metrics
+    name = None
+    # Name shown to users
+    display_name = None
+    # Sample format of the chunks, S16LE or F32LE
+    sample_format = "S16LE"
+    # Requests synthesized at once, at most
+    max_workers = 5
+    # Keep the voice list on disk between processes
+    cache_voices = False
+
+    def __init__(self):
+        # Saved and reported by the provider
+        self.phoneme_cache = PhonemeCache(f"speech-provider-{self.name}")
+
+    @property
+    def sample_size(self):
+        return 4 if self.sample_format == "F32LE" else 2
+
+    def acquire_voice(self, voice_id):
+        """Returns a loaded voice, to be released after use."""
+        raise NotImplementedError
+
+    def release_voice(self, voice_id, voice):
+        pass
+
+    def sample_rate(self, voice):
+        raise NotImplementedError
+
+    def synthesize(self, voice, request, segment, sample_rate):
+        """
+        Yields the audio of `segment.text` spoken at `segment.rate`, in
+        `sample_rate` and `sample_format`, as objects supporting the buffer
+        protocol. The provider writes each one before asking for the next,
+        a chunk a sentence lets the first one be heard early.
+        """
+        raise NotImplementedError
+
+    def list_voices(self):
+        """The voices as (name, id, format, features, languages) tuples."""
+        raise NotImplementedError
+
+    def voice_directories(self):
+        """Directories watched for voices being installed or removed."""
+        return []
+
+    def faster_segments(self, segments):
+        """
+        Segments to speak instead while the provider is under load, trading
+        quality for speed, or None to speak them as they are.
+        """
+        return None
+
+    def preload(self):
+        """Called in a thread on startup, to load what is likely needed."""
+        pass
+
+    def release(self):
+        """Frees what can be loaded again, the provider is idle."""
+        pass
+
+    def save(self):
+        """Stores state for the next process, the provider is exiting."""
+        pass
+
+    def stats(self):
+        """A dictionary of dictionaries of numbers or strings by component."""
+        return {}
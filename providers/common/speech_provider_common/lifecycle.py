@@ -0,0 +1,122 @@
+# SPDX-License-Identifer: GPL-3.0-or-later
+
+from collections import deque
+from gi.repository import GLib
+import os
+from time import monotonic
+
+# How long models stay loaded after the last request, before we have seen
+# enough traffic to guess.
+DEFAULT_WARM_SECONDS = int(os.environ.get("SPEECH_PROVIDER_WARM_SECONDS", 120))
+MIN_WARM_SECONDS = int(os.environ.get("SPEECH_PROVIDER_MIN_WARM_SECONDS", 30))
+MAX_WARM_SECONDS = int(os.environ.get("SPEECH_PROVIDER_MAX_WARM_SECONDS", 900))
+# How long to hold on to the bus name with models unloaded before exiting.
+STANDBY_SECONDS = int(os.environ.get("SPEECH_PROVIDER_STANDBY_SECONDS", 300))
+
+# Gaps kept for estimating when the next request is likely.
+HISTORY_LENGTH = 32
+# Gaps longer than this are separate sessions, not part of the traffic
+# pattern we are trying to keep warm for.
+SESSION_GAP_SECONDS = 3600
+# Keep warm for this much longer than the typical gap.
+WARM_MARGIN = 1.5
+
+ACTIVE = "active"
+STANDBY = "standby"
+EXITING = "exiting"
+
+
+class Lifecycle(object):
+    """
+    Decides when a provider unloads its models and when it exits.
+
+    After a request the provider stays warm for a window derived from
+    recent request inter-arrival times, so bursty use like reading a page
+    with pauses in between doesn't pay for reloading models. Once the
+    window passes without traffic `release` is called to free model memory,
+    but the bus name is kept so the next request only pays for loading the
+    model, not for starting the process. After a while in standby `quit` is
+    called, unless `keep_alive` is set.
+
+    `is_idle` is polled before each transition, nothing changes while
+    synthesis is in progress. All methods are expected to be called from the
+    main loop.
+    """
+
+    def __init__(self, is_idle, release, quit, keep_alive=False):
+        self._is_idle = is_idle
+        self._release = release
+        self._quit = quit
+        self.keep_alive = keep_alive
+        self.state = ACTIVE
+        self._gaps = deque(maxlen=HISTORY_LENGTH)
+        self._last_request = None
+        self._timeout_id = 0
+        self._stats = {
+            "requests": 0,
+            "standbys": 0,
+            "standby-wakeups": 0,
+            "busy-deferrals": 0,
+        }
+        self._arm(self.warm_seconds, self._on_warm_timeout)
+
+    @property
+    def warm_seconds(self):
+        if len(self._gaps) < 2:
+            return DEFAULT_WARM_SECONDS
+        gaps = sorted(self._gaps)
+        typical = gaps[int(len(gaps) * 0.9) - 1]
+        return int(min(max(typical * WARM_MARGIN, MIN_WARM_SECONDS), MAX_WARM_SECONDS))
+
+    def activity(self):
+        """Called when a request comes in."""
+        now = monotonic()
+        if self._last_request is not None:
+            gap = now - self._last_request
+            if gap < SESSION_GAP_SECONDS:
+                self._gaps.append(gap)
+        self._last_request = now
+        self._stats["requests"] += 1
+        if self.state == STANDBY:
+            self._stats["standby-wakeups"] += 1
+        self.state = ACTIVE
+        self._arm(self.warm_seconds, self._on_warm_timeout)
+
+    def _arm(self, seconds, callback):
+        if self._timeout_id:
+            GLib.source_remove(self._timeout_id)
+        self._timeout_id = GLib.timeout_add_seconds(max(seconds, 1), callback)
+
+    def _on_warm_timeout(self):
+        self._timeout_id = 0
+        if not self._is_idle():
+            # Still synthesizing a long text, check again later.
+            self._stats["busy-deferrals"] += 1
+            self._arm(MIN_WARM_SECONDS, self._on_warm_timeout)
+            return False
+        self.state = STANDBY
+        self._stats["standbys"] += 1
+        self._release()
+        if not self.keep_alive:
+            self._arm(STANDBY_SECONDS, self._on_standby_timeout)
+        return False
+
+    def _on_standby_timeout(self):
+        self._timeout_id = 0
+        if not self._is_idle():
+            self._stats["busy-deferrals"] += 1
+            self._arm(MIN_WARM_SECONDS, self._on_standby_timeout)
+            return False
+        self.state = EXITING
+        self._quit()
+        return False
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats["state"] = self.state
+        stats["warm-seconds"] = self.warm_seconds
+        stats["standby-seconds"] = STANDBY_SECONDS
+        stats["mean-inter-arrival"] = (
+            sum(self._gaps) / len(self._gaps) if self._gaps else 0.0
+        )
+        return stats
@@ -0,0 +1,127 @@
+# SPDX-License-Identifer: GPL-3.0-or-later
+
+from contextlib import nullcontext
+import json
+import os
+import sys
+import threading
+from time import perf_counter
+
+# Print a line of timings for every request.
+TRACE = bool(os.environ.get("SPEECH_PROVIDER_TRACE"))
+# Periodically write metrics in the Prometheus text format to this file.
+METRICS_FILE = os.environ.get("SPEECH_PROVIDER_METRICS_FILE")
+ENABLED = bool(TRACE or METRICS_FILE or os.environ.get("SPEECH_PROVIDER_METRICS"))
+
+_NO_SPAN = nullcontext()
+
+
+class _Span(object):
+    __slots__ = ("_trace", "_name", "_start")
+
+    def __init__(self, trace, name):
+        self._trace = trace
+        self._name = name
+
+    def __enter__(self):
+        self._start = perf_counter()
+
+    def __exit__(self, *exc_info):
+        self._trace.add(self._name, perf_counter() - self._start)
+
+
+class Trace(object):
+    """Time spent in each stage of a request, in seconds."""
+
+    def __init__(self):
+        self.timings = {}
+        self.audio_bytes = 0
+        self.bytes_per_second = 0
+
+    def add(self, name, seconds):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def span(self, name):
+        return _Span(self, name)
+
+    @property
+    def audio_seconds(self):
+        if not self.bytes_per_second:
+            return 0.0
+        return self.audio_bytes / self.bytes_per_second
+
+
+def span(request, name):
+    """Times a block against `request`, does nothing when metrics are off."""
+    if request.trace is None:
+        return _NO_SPAN
+    return request.trace.span(name)
+
+
+class Metrics(object):
+    """
+    Process wide counters and summaries. Everything is a no-op unless
+    metrics are enabled through the environment.
+    """
+
+    def __init__(self, enabled=ENABLED):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._summaries = {}
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def observe(self, name, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            summary = self._summaries.get(name)
+            if summary:
+                summary[0] += 1
+                summary[1] += value
+                summary[2] = max(summary[2], value)
+            else:
+                self._summaries[name] = [1, value, value]
+
+    def finish(self, request):
+        """Folds the trace of a completed request into the totals."""
+        trace = request.trace
+        if trace is None:
+            return
+        for name, seconds in trace.timings.items():
+            self.observe(f"{name}-seconds", seconds)
+        self.observe("audio-bytes", trace.audio_bytes)
+        audio_seconds = trace.audio_seconds
+        if audio_seconds and "synthesis" in trace.timings:
+            self.observe("real-time-factor", trace.timings["synthesis"] / audio_seconds)
+        if TRACE:
+            print(
+                json.dumps(
+                    {
+                        "voice": request.voice_id,
+                        "characters": len(request.text),
+                        "audio-bytes": trace.audio_bytes,
+                        "audio-seconds": round(audio_seconds, 3),
+                        "first-audio": request.first_audio_latency,
+                        **{k: round(v, 6) for k, v in trace.timings.items()},
+                    }
+                ),
+                file=sys.stderr,
+            )
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            for name, (count, total, maximum) in self._summaries.items():
+                stats[f"{name}.count"] = count
+                stats[f"{name}.sum"] = total
+                stats[f"{name}.max"] = maximum
+            return stats
+
+
+metrics = Metrics()
@@ -0,0 +1,92 @@
+# SPDX-License-Identifer: GPL-3.0-or-later
+
+from collections import OrderedDict
+from gi.repository import GLib
+from pathlib import Path
+import json
+import os
+import threading
+
+DEFAULT_MAX_ENTRIES = int(os.environ.get("SPEECH_PROVIDER_PHONEME_CACHE_ENTRIES", 4096))
+# Keep phonemes across sessions
+PERSIST = bool(os.environ.get("SPEECH_PROVIDER_PHONEME_CACHE_PERSIST"))
+
+
+class PhonemeCache(object):
+    """
+    Phonemization results of sentences by voice, so repeated text only
+    needs inference. Entries can be anything that serializes to JSON, and
+    the least recently used are dropped once there are more than
+    `max_entries`.
+
+    When persistent, the cache is loaded from the user cache directory on
+    creation and written back by `save()`.
+    """
+
+    def __init__(self, name, max_entries=DEFAULT_MAX_ENTRIES, persist=PERSIST):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._path = None
+        if persist:
+            self._path = Path(GLib.get_user_cache_dir()) / name / "phonemes.json"
+            self._load()
+
+    def _load(self):
+        try:
+            entries = json.loads(self._path.read_text())
+        except (OSError, ValueError):
+            return
+        for voice, sentence, phonemes in entries[-self.max_entries :]:
+            self._entries[(voice, sentence)] = phonemes
+
+    def get(self, voice, sentence):
+        key = (voice, sentence)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, voice, sentence, phonemes):
+        with self._lock:
+            self._entries[(voice, sentence)] = phonemes
+            self._entries.move_to_end((voice, sentence))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    def save(self):
+        if not self._path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = [
+                [voice, sentence, phonemes]
+                for (voice, sentence), phonemes in self._entries.items()
+            ]
+            self._dirty = False
+        try:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self._path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(entries))
+            os.replace(tmp_path, self._path)
+        except OSError as e:
+            print("WARNING: failed to store phoneme cache:", e)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit-rate": self.hits / lookups if lookups else 0.0,
+            }
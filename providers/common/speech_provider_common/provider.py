@@ -0,0 +1,305 @@
+# SPDX-License-Identifer: GPL-3.0-or-later
+
+from gi.repository import GObject, GLib
+from dasbus.connection import SessionMessageBus
+from dasbus.error import ErrorMapper, ErrorRule
+from dasbus.unix import GLibServerUnix
+from dasbus.server.property import PropertiesInterface
+from dasbus.typing import UnixFD, Str, Double, Bool, List, Tuple, UInt64
+import os
+import threading
+from time import perf_counter
+from .audio_cache import AudioCache, cache_key, DEFAULT_MEMORY_BYTES, DEFAULT_DISK_BYTES
+from .lifecycle import Lifecycle
+from .metrics import span
+from .scheduler import WorkerScheduler, SynthesisRequest, SynthesisExecutor, QueueFull
+from .ssml import plan_segments
+from .stats import StatsInterface
+from .transport import DirectOutput, PitchPipeline
+from .voice_index import VoiceIndex
+
+# Errors of Synthesize calls that clients can tell apart and retry
+ERROR_MAPPER = ErrorMapper()
+ERROR_MAPPER.add_rule(
+    ErrorRule(
+        exception_type=QueueFull,
+        error_name="org.freedesktop.Speech.Provider.Error.QueueFull",
+    )
+)
+
+
+class SynthWorker(GObject.Object):
+    """
+    Synthesizes one request at a time with the provider's engine, on the
+    provider's executor.
+    """
+
+    def __init__(self, provider):
+        super().__init__()
+        self._provider = provider
+        self.engine = provider.engine
+        self._pitch_pipeline = None
+        self._pending = 0
+
+    @GObject.Signal
+    def done(self):
+        pass
+
+    def _on_finished(self, *args):
+        # Done once both the synthesis thread and the output are finished.
+        self._pending -= 1
+        if not self._pending:
+            self.emit("done")
+        return False
+
+    def _cache_key(self, request, segments):
+        # Pitch is changed on the way out, audio changing pitch part way
+        # can't be replayed from the cache.
+        if len({segment.pitch for segment in segments}) > 1:
+            return None
+        return cache_key(
+            self.engine.name,
+            self.engine.sample_format,
+            ",".join(segment.voice_id for segment in segments if segment.text),
+            request.is_ssml,
+            request.rate,
+            request.text,
+        )
+
+    def _synth(self, output, request, segments):
+        try:
+            key = self._cache_key(request, segments)
+            cached = self._provider.audio_cache.get(key)
+            if not cached and self._provider.scheduler.under_load:
+                # Only for what isn't cached in the requested quality
+                faster = self.engine.faster_segments(segments)
+                if faster:
+                    segments = faster
+                    key = self._cache_key(request, segments)
+                    cached = self._provider.audio_cache.get(key)
+            if cached:
+                sample_rate, audio = cached
+                request.audio_format(sample_rate, self.engine.sample_size)
+                output.start(sample_rate)
+                output.write(audio)
+                request.audio_written(len(audio))
+                return
+
+            self._synth_segments(output, request, segments, key)
+        except BrokenPipeError:
+            # The client stopped listening
+            request.cancelled = True
+        finally:
+            output.close()
+            GLib.idle_add(self._on_finished)
+
+    def _synth_segments(self, output, request, segments, key):
+        voices = {}
+
+        def acquire(voice_id):
+            # Voices switched to are loaded as they are reached.
+            if voice_id not in voices:
+                with span(request, "model-load"):
+                    voices[voice_id] = self.engine.acquire_voice(voice_id)
+            return voices[voice_id]
+
+        try:
+            spoken = [segment for segment in segments if segment.text]
+            if not spoken:
+                return
+            # The stream has the sample rate of the first voice.
+            sample_rate = self.engine.sample_rate(acquire(spoken[0].voice_id))
+            request.audio_format(sample_rate, self.engine.sample_size)
+            output.start(sample_rate)
+            recorder = self._provider.audio_cache.recorder(key, sample_rate)
+            # The output starts with the first segment's pitch.
+            pitch = segments[0].pitch
+            for segment in segments:
+                if request.cancelled:
+                    return
+                if segment.pitch != pitch:
+                    pitch = segment.pitch
+                    output.set_pitch(pitch)
+                if segment.text:
+                    voice = acquire(segment.voice_id)
+                    self._synth_text(output, request, segment, voice, sample_rate, recorder)
+                else:
+                    # Zeros are silence in both sample formats.
+                    silence = bytes(int(sample_rate * segment.pause) * self.engine.sample_size)
+                    output.write(silence)
+                    request.audio_written(len(silence))
+                    recorder.append(silence)
+            # Stopping in the last segment leaves the loop like finishing,
+            # partial audio must not be cached as the whole text's.
+            if request.cancelled:
+                return
+            recorder.commit()
+        finally:
+            for voice_id, voice in voices.items():
+                self.engine.release_voice(voice_id, voice)
+
+    def _synth_text(self, output, request, segment, voice, sample_rate, recorder):
+        chunks = self.engine.synthesize(voice, request, segment, sample_rate)
+        try:
+            while not request.cancelled:
+                start = perf_counter()
+                chunk = next(chunks, None)
+                request.inference_seconds += perf_counter() - start
+                if chunk is None:
+                    return
+                output.write(chunk)
+                request.audio_written(memoryview(chunk).nbytes)
+                recorder.append(chunk)
+        finally:
+            chunks.close()
+
+    def synthesize(self, request):
+        segments = plan_segments(request, self._provider.voice_for_language)
+        if any(segment.pitch != 1 for segment in segments):
+            if not self._pitch_pipeline:
+                self._pitch_pipeline = PitchPipeline(self.engine.sample_format)
+                self._pitch_pipeline.connect("done", self._on_finished)
+            output = self._pitch_pipeline
+            # Also the pitch of audio replayed from the cache, which is the
+            # same for all its segments.
+            output.open(request.fd, segments[0].pitch)
+        else:
+            output = DirectOutput(request.fd)
+            output.connect("done", self._on_finished)
+
+        self._pending = 2
+        self._provider.executor.submit(self._synth, output, request, segments)
+
+    def shutdown(self):
+        if self._pitch_pipeline:
+            self._pitch_pipeline.shutdown()
+            self._pitch_pipeline = None
+
+
+class SpeechProvider(PropertiesInterface, StatsInterface):
+    """
+    The org.freedesktop.Speech.Provider interface around an `Engine`.
+    Providers subclass it with the interface decorators and their stats
+    interface, everything else is shared.
+    """
+
+    def __init__(self, loop, engine):
+        super().__init__()
+        self._loop = loop
+        self.engine = engine
+        self._voice_index = None
+        self.audio_cache = AudioCache(
+            f"speech-provider-{engine.name}",
+            int(
+                os.environ.get(
+                    "SPEECH_PROVIDER_AUDIO_CACHE_MEMORY_BYTES", DEFAULT_MEMORY_BYTES
+                )
+            ),
+            int(
+                os.environ.get(
+                    "SPEECH_PROVIDER_AUDIO_CACHE_DISK_BYTES", DEFAULT_DISK_BYTES
+                )
+            ),
+        )
+        # One thread for each worker the scheduler may create, made once and
+        # reused instead of a thread per request.
+        self.executor = SynthesisExecutor(engine.max_workers, f"{engine.name}-synth")
+        self.scheduler = WorkerScheduler(lambda: SynthWorker(self), engine.max_workers)
+        self._lifecycle = Lifecycle(
+            lambda: self.scheduler.is_idle,
+            self._release,
+            loop.quit,
+            bool(os.environ.get("KEEP_ALIVE")),
+        )
+
+    @property
+    def voice_index(self):
+        # Created on first use, finding the voice directories may need the
+        # engine's imports.
+        if not self._voice_index:
+            self._voice_index = VoiceIndex(
+                self.engine.list_voices,
+                self.engine.voice_directories(),
+                f"speech-provider-{self.engine.name}" if self.engine.cache_voices else None,
+            )
+            self._voice_index.connect("changed", self._on_voices_changed)
+        return self._voice_index
+
+    def voice_for_language(self, language):
+        return self.voice_index.voice_for_language(language)
+
+    def _on_voices_changed(self, voice_index):
+        self.report_changed_property("Voices")
+        self.flush_changes()
+
+    def preload(self):
+        threading.Thread(target=self.engine.preload, daemon=True).start()
+
+    def _release(self):
+        self.scheduler.drop_idle_workers()
+        self.audio_cache.clear_memory()
+        self.engine.phoneme_cache.save()
+        self.engine.release()
+
+    def save(self):
+        self.engine.phoneme_cache.save()
+        self.engine.save()
+
+    def collect_stats(self):
+        stats = super().collect_stats()
+        stats.update(
+            {
+                "scheduler": self.scheduler.stats(),
+                "lifecycle": self._lifecycle.stats(),
+                "audio-cache": self.audio_cache.stats(),
+                "phoneme-cache": self.engine.phoneme_cache.stats(),
+            }
+        )
+        stats.update(self.engine.stats())
+        return stats
+
+    def Synthesize(
+        self,
+        fd: UnixFD,
+        utterance: Str,
+        voice_id: Str,
+        pitch: Double,
+        rate: Double,
+        is_ssml: Bool,
+        language: Str,
+    ):
+        self._lifecycle.activity()
+        self.scheduler.submit(
+            SynthesisRequest(fd, utterance, voice_id, pitch, rate, is_ssml, language)
+        )
+
+    @property
+    def Name(self) -> Str:
+        return self.engine.display_name
+
+    @property
+    def Voices(self) -> List[Tuple[Str, Str, Str, UInt64, List[Str]]]:
+        return self.voice_index.voices
+
+
+def run_provider(provider_class, engine, bus_name):
+    """
+    Serves `engine` through `provider_class` on the session bus until the
+    provider is done.
+    """
+    mainloop = GLib.MainLoop()
+    bus = SessionMessageBus(error_mapper=ERROR_MAPPER)
+    provider = provider_class(mainloop, engine)
+    bus.publish_object(
+        "/" + bus_name.replace(".", "/"),
+        provider,
+        server=GLibServerUnix,
+    )
+    # Own the name as soon as possible, the voices load in the background.
+    bus.register_service(bus_name)
+    provider.start_metrics_file(engine.name)
+    provider.preload()
+
+    mainloop.run()
+    provider.save()
+    return 0
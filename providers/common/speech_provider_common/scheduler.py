@@ -0,0 +1,368 @@
+# SPDX-License-Identifer: GPL-3.0-or-later
+
+from gi.repository import GLib
+import heapq
+import itertools
+import os
+import queue
+import threading
+import traceback
+from time import time
+from .metrics import metrics, Trace
+
+DEFAULT_MAX_WORKERS = 5
+DEFAULT_MAX_QUEUE = 64
+# Queue entries only short requests may take, so they aren't turned away
+# by a backlog of long reads.
+SHORT_QUEUE_RESERVE = 8
+SHORT_UTTERANCE_LENGTH = 32  # Characters
+FIRST_AUDIO_TARGET = (
+    int(os.environ.get("SPEECH_PROVIDER_FIRST_AUDIO_TARGET_MS", 250)) / 1000
+)
+# Under load once this many requests wait, or synthesis takes this share of
+# the audio's duration. Load subsides below the lower real time factor with
+# an empty queue.
+LOADED_QUEUE_DEPTH = int(os.environ.get("SPEECH_PROVIDER_LOADED_QUEUE_DEPTH", 2))
+LOADED_REALTIME_FACTOR = float(
+    os.environ.get("SPEECH_PROVIDER_LOADED_REALTIME_FACTOR", 0.8)
+)
+UNLOADED_REALTIME_FACTOR = float(
+    os.environ.get("SPEECH_PROVIDER_UNLOADED_REALTIME_FACTOR", 0.5)
+)
+# Weight of the latest request in the smoothed real time factor
+REALTIME_FACTOR_WEIGHT = 0.2
+# While under load, how often the smoothed real time factor decays when no
+# request is running, as if by a request synthesized instantly.
+LOAD_DECAY_INTERVAL = 1  # Seconds
+
+
+class QueueFull(Exception):
+    """Raised by `WorkerScheduler.submit()` for a request there is no room for."""
+
+
+class SynthesisExecutor(object):
+    """
+    A fixed set of threads running synthesis jobs. Threads are started as
+    jobs need them, up to `max_threads`, and then reused. Jobs submitted
+    while all of them are busy wait for one to be done.
+    """
+
+    def __init__(self, max_threads, name):
+        self.max_threads = max_threads
+        self.name = name
+        self._jobs = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._threads = []
+        # Threads waiting for a job that none was submitted for yet
+        self._idle = 0
+
+    def submit(self, function, *args):
+        with self._lock:
+            if self._idle:
+                self._idle -= 1
+            elif len(self._threads) < self.max_threads:
+                thread = threading.Thread(
+                    target=self._run,
+                    name=f"{self.name}-{len(self._threads)}",
+                    daemon=True,
+                )
+                self._threads.append(thread)
+                thread.start()
+        self._jobs.put((function, args))
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            function, args = job
+            try:
+                function(*args)
+            except Exception:
+                # Like an uncaught exception in a thread of its own
+                traceback.print_exc()
+            with self._lock:
+                self._idle += 1
+
+    def shutdown(self):
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _thread in threads:
+            self._jobs.put(None)
+        for thread in threads:
+            thread.join()
+
+
+class SynthesisRequest(object):
+    def __init__(self, fd, text, voice_id, pitch, rate, is_ssml=False, language=""):
+        self.fd = fd
+        self.text = text
+        self.voice_id = voice_id
+        self.pitch = pitch
+        self.rate = rate
+        self.is_ssml = is_ssml
+        self.language = language
+        self.queued_at = time()
+        self.started_at = None
+        self.first_audio_at = None
+        self.cancelled = False
+        self.audio_bytes = 0
+        self.bytes_per_second = 0
+        # Time spent running models, as opposed to waiting on the client
+        self.inference_seconds = 0.0
+        self.trace = Trace() if metrics.enabled else None
+        self._watch_id = 0
+
+    @property
+    def priority(self):
+        # Short utterances are typically UI feedback that needs to be
+        # snappy, let them jump ahead of long reads.
+        return 0 if len(self.text) <= SHORT_UTTERANCE_LENGTH else 1
+
+    @property
+    def first_audio_latency(self):
+        if self.first_audio_at is None:
+            return None
+        return self.first_audio_at - self.queued_at
+
+    @property
+    def realtime_factor(self):
+        """Inference time over audio duration, None if nothing was inferred."""
+        if not (self.inference_seconds and self.audio_bytes and self.bytes_per_second):
+            return None
+        return self.inference_seconds * self.bytes_per_second / self.audio_bytes
+
+    def audio_written(self, size=0):
+        # Called from the synthesis thread.
+        if self.first_audio_at is None:
+            self.first_audio_at = time()
+        self.audio_bytes += size
+        if self.trace:
+            self.trace.audio_bytes += size
+
+    def audio_format(self, sample_rate, sample_size=2):
+        self.bytes_per_second = sample_rate * sample_size
+        if self.trace:
+            self.trace.bytes_per_second = sample_rate * sample_size
+
+
+class WorkerScheduler(object):
+    """
+    Dispatches synthesis requests to a bounded set of workers.
+
+    Workers are created on demand by `create_worker` and are expected to
+    have `synthesize(request)` and `shutdown()` methods and a "done" signal. When all workers
+    are busy, requests wait in a queue ordered by priority and then arrival.
+    Requests whose client goes away while queued are dropped, and marked
+    cancelled for the worker to stop early when already synthesizing.
+    Requests that don't fit in the queue are rejected with `QueueFull`,
+    long ones already when only the room reserved for short ones is left.
+
+    All methods are expected to be called from the main loop.
+    """
+
+    def __init__(
+        self, create_worker, max_workers=DEFAULT_MAX_WORKERS, max_queue=DEFAULT_MAX_QUEUE
+    ):
+        self._create_worker = create_worker
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._workers = []
+        self._idle_workers = []
+        self._running = {}
+        self._queue = []
+        self._queue_length = 0
+        self._sequence = itertools.count()
+        self._realtime_factor = 0.0
+        self._under_load = False
+        self._load_timeout_id = 0
+        self._stats = {
+            "submitted": 0,
+            "dispatched": 0,
+            "rejected": 0,
+            "cancelled": 0,
+            "max-queue-depth": 0,
+            "total-wait-time": 0.0,
+            "max-wait-time": 0.0,
+            "completed": 0,
+            "cancelled-in-flight": 0,
+            "total-first-audio-latency": 0.0,
+            "max-first-audio-latency": 0.0,
+            "first-audio-over-target": 0,
+        }
+
+    @property
+    def is_idle(self):
+        return len(self._idle_workers) == len(self._workers) and not self._queue_length
+
+    @property
+    def under_load(self):
+        """
+        Whether requests are piling up or synthesis is close to slower than
+        real time, for providers to trade quality for speed. May be read
+        from any thread.
+        """
+        return self._under_load
+
+    def _update_load(self):
+        if (
+            self._queue_length >= LOADED_QUEUE_DEPTH
+            or self._realtime_factor >= LOADED_REALTIME_FACTOR
+        ):
+            self._under_load = True
+        elif not self._queue_length and self._realtime_factor < UNLOADED_REALTIME_FACTOR:
+            self._under_load = False
+        if self._under_load and not self._load_timeout_id:
+            self._load_timeout_id = GLib.timeout_add_seconds(
+                LOAD_DECAY_INTERVAL, self._on_load_timeout
+            )
+
+    def _on_load_timeout(self):
+        # Without further requests nothing else notices load subsiding.
+        if not self._running and not self._queue_length:
+            self._realtime_factor *= 1 - REALTIME_FACTOR_WEIGHT
+        self._update_load()
+        if self._under_load:
+            return True
+        self._load_timeout_id = 0
+        return False
+
+    def submit(self, request):
+        self._stats["submitted"] += 1
+        worker = self._get_idle_worker()
+        limit = self.max_queue - (SHORT_QUEUE_RESERVE if request.priority else 0)
+        if not worker and self._queue_length >= limit:
+            print("WARNING: synthesis queue full, rejecting request")
+            self._stats["rejected"] += 1
+            os.close(request.fd)
+            raise QueueFull("Synthesis queue is full")
+
+        # Watched until the request is done, so requests whose client went
+        # away are dropped from the queue or stopped while synthesizing.
+        request._watch_id = GLib.io_add_watch(
+            request.fd,
+            GLib.PRIORITY_DEFAULT,
+            GLib.IOCondition.ERR | GLib.IOCondition.HUP | GLib.IOCondition.NVAL,
+            self._on_client_gone,
+            request,
+        )
+        if worker:
+            self._dispatch(worker, request)
+            return
+
+        heapq.heappush(
+            self._queue, (request.priority, next(self._sequence), request)
+        )
+        self._queue_length += 1
+        self._stats["max-queue-depth"] = max(
+            self._stats["max-queue-depth"], self._queue_length
+        )
+        self._update_load()
+
+    def _get_idle_worker(self):
+        if self._idle_workers:
+            return self._idle_workers.pop()
+        if len(self._workers) < self.max_workers:
+            worker = self._create_worker()
+            worker.connect("done", self._on_done)
+            self._workers.append(worker)
+            return worker
+        return None
+
+    def _dispatch(self, worker, request):
+        request.started_at = time()
+        wait_time = request.started_at - request.queued_at
+        self._stats["dispatched"] += 1
+        self._stats["total-wait-time"] += wait_time
+        self._stats["max-wait-time"] = max(self._stats["max-wait-time"], wait_time)
+        if request.trace:
+            request.trace.add("queue-wait", wait_time)
+        self._running[worker] = request
+        worker.synthesize(request)
+
+    def _finish(self, request):
+        if request._watch_id:
+            GLib.source_remove(request._watch_id)
+            request._watch_id = 0
+        if request.cancelled:
+            self._stats["cancelled-in-flight"] += 1
+            return
+        self._stats["completed"] += 1
+        realtime_factor = request.realtime_factor
+        if realtime_factor is not None:
+            self._realtime_factor += REALTIME_FACTOR_WEIGHT * (
+                realtime_factor - self._realtime_factor
+            )
+        if request.trace:
+            request.trace.add("synthesis", time() - request.started_at)
+            metrics.finish(request)
+        latency = request.first_audio_latency
+        if latency is None:
+            return
+        self._stats["total-first-audio-latency"] += latency
+        self._stats["max-first-audio-latency"] = max(
+            self._stats["max-first-audio-latency"], latency
+        )
+        # Counted rather than logged, under load most requests are late.
+        if latency > FIRST_AUDIO_TARGET:
+            self._stats["first-audio-over-target"] += 1
+
+    def _pop_request(self):
+        while self._queue:
+            _priority, _sequence, request = heapq.heappop(self._queue)
+            if request.cancelled:
+                continue
+            self._queue_length -= 1
+            return request
+        return None
+
+    def _on_done(self, worker):
+        self._finish(self._running.pop(worker))
+        request = self._pop_request()
+        self._update_load()
+        if request:
+            self._dispatch(worker, request)
+        else:
+            self._idle_workers.append(worker)
+
+    def drop_idle_workers(self):
+        """Shuts down idle workers, they are recreated when needed."""
+        for worker in self._idle_workers:
+            self._workers.remove(worker)
+            worker.shutdown()
+        self._idle_workers = []
+
+    def _on_client_gone(self, fd, condition, request):
+        request._watch_id = 0
+        if condition & GLib.IOCondition.NVAL:
+            # The worker closed the fd, the request is about to be done.
+            return False
+        request.cancelled = True
+        if request.started_at is not None:
+            # The worker notices and stops between sentences.
+            return False
+        # Leave the entry in the heap, it is skipped when popped.
+        self._queue_length -= 1
+        self._stats["cancelled"] += 1
+        os.close(request.fd)
+        return False
+
+    def stats(self):
+        stats = dict(self._stats)
+        dispatched = stats["dispatched"]
+        stats["queue-depth"] = self._queue_length
+        stats["workers"] = len(self._workers)
+        stats["busy-workers"] = len(self._workers) - len(self._idle_workers)
+        stats["realtime-factor"] = self._realtime_factor
+        stats["under-load"] = int(self._under_load)
+        # Both should stay flat however busy we are.
+        stats["threads"] = threading.active_count()
+        stats["open-fds"] = len(os.listdir("/proc/self/fd"))
+        stats["mean-wait-time"] = (
+            stats["total-wait-time"] / dispatched if dispatched else 0.0
+        )
+        completed = stats["completed"]
+        stats["mean-first-audio-latency"] = (
+            stats["total-first-audio-latency"] / completed if completed else 0.0
+        )
+        return stats
@@ -0,0 +1,233 @@
+# SPDX-License-Identifer: GPL-3.0-or-later
+
+import copy
+import re
+import xml.etree.ElementTree as ET
+
+# Keyword values of <prosody> attributes relative to the request's own
+RATES = {
+    "x-slow": 0.5,
+    "slow": 0.75,
+    "medium": 1.0,
+    "fast": 1.25,
+    "x-fast": 1.75,
+    "default": 1.0,
+}
+PITCHES = {
+    "x-low": 0.7,
+    "low": 0.85,
+    "medium": 1.0,
+    "high": 1.15,
+    "x-high": 1.3,
+    "default": 1.0,
+}
+# Seconds of silence for <break strength>
+BREAK_STRENGTHS = {
+    "none": 0.0,
+    "x-weak": 0.1,
+    "weak": 0.25,
+    "medium": 0.5,
+    "strong": 0.75,
+    "x-strong": 1.0,
+}
+# Longer breaks are cut short, they are allocated in one go.
+MAX_BREAK_SECONDS = 10.0
+# Rates and pitches are kept within these factors of 1.
+MIN_PROSODY = 0.1
+MAX_PROSODY = 10.0
+
+# Elements that start and end a sentence of their own
+_BLOCKS = ("speak", "p", "s", "voice", "lang")
+_XML_LANG = "{http://www.w3.org/XML/1998/namespace}lang"
+_TAG = re.compile(r"<[^>]*>")
+_TIME = re.compile(r"([\d.]+)\s*(ms|s)")
+
+
+class Segment(object):
+    """
+    A run of text spoken with one voice, rate and pitch, or a pause of
+    `pause` seconds when there is no text.
+    """
+
+    def __init__(self, text="", voice_id="", language="", rate=1.0, pitch=1.0, pause=0.0):
+        self.text = text
+        self.voice_id = voice_id
+        self.language = language
+        self.rate = rate
+        self.pitch = pitch
+        self.pause = pause
+
+    def speaks_like(self, other):
+        return (self.voice_id, self.language, self.rate, self.pitch) == (
+            other.voice_id,
+            other.language,
+            other.rate,
+            other.pitch,
+        )
+
+    def __repr__(self):
+        if not self.text:
+            return f"Segment(pause={self.pause})"
+        return (
+            f"Segment({self.text!r}, voice_id={self.voice_id!r}, "
+            f"language={self.language!r}, rate={self.rate}, pitch={self.pitch})"
+        )
+
+
+def _prosody_factor(value, keywords, base, current):
+    if value in keywords:
+        return base * keywords[value]
+    if value.endswith("%"):
+        number = float(value[:-1])
+        if value[0] in "+-":
+            return current * (1 + number / 100)
+        return base * number / 100
+    if value.endswith("st"):
+        return current * 2 ** (float(value[:-2]) / 12)
+    return base * float(value)
+
+
+def _prosody(value, keywords, base, current):
+    value = value.strip().lower()
+    try:
+        factor = _prosody_factor(value, keywords, base, current)
+    except ValueError:
+        factor = None
+    # Engines divide by the rate, and can't speak backwards.
+    if factor is None or not factor > 0:
+        print(f"WARNING: ignoring unsupported prosody value {value}")
+        return current
+    return min(max(factor, MIN_PROSODY), MAX_PROSODY)
+
+
+def _break_seconds(element):
+    match = _TIME.fullmatch(element.get("time", "").strip().lower())
+    if match:
+        seconds = float(match[1]) / (1000 if match[2] == "ms" else 1)
+    else:
+        seconds = BREAK_STRENGTHS.get(element.get("strength", "medium"), 0.5)
+    return min(seconds, MAX_BREAK_SECONDS)
+
+
+class _Parser(object):
+    def __init__(self, base):
+        self.base = base
+        self.segments = []
+        # Whether text can still be added to the last segment
+        self._open = False
+
+    def text(self, text, state):
+        if not text:
+            return
+        last = self.segments[-1] if self.segments else None
+        if self._open and last.speaks_like(state):
+            last.text += text
+        elif text.strip():
+            segment = copy.copy(state)
+            segment.text = text
+            self.segments.append(segment)
+            self._open = True
+
+    def pause(self, seconds, state):
+        if seconds > 0:
+            # Keeps the surrounding pitch so it doesn't count as a change.
+            segment = copy.copy(state)
+            segment.text = ""
+            segment.pause = seconds
+            self.segments.append(segment)
+        self._open = False
+
+    def walk(self, element, state):
+        tag = element.tag.rpartition("}")[2]
+        if tag == "break":
+            self.pause(_break_seconds(element), state)
+            return
+        if tag in ("mark", "desc"):
+            return
+
+        state = copy.copy(state)
+        language = element.get(_XML_LANG)
+        if language and language != state.language:
+            # Another language, unless a voice is named pick one for it.
+            state.language = language
+            state.voice_id = ""
+        if tag == "voice" and element.get("name"):
+            state.voice_id = element.get("name")
+        elif tag == "prosody":
+            if element.get("rate"):
+                state.rate = _prosody(element.get("rate"), RATES, self.base.rate, state.rate)
+            if element.get("pitch"):
+                state.pitch = _prosody(
+                    element.get("pitch"), PITCHES, self.base.pitch, state.pitch
+                )
+
+        if tag in _BLOCKS:
+            self._open = False
+        if tag == "sub" and element.get("alias"):
+            self.text(element.get("alias"), state)
+        else:
+            self.text(element.text, state)
+            for child in element:
+                self.walk(child, state)
+                self.text(child.tail, state)
+        if tag in _BLOCKS:
+            self._open = False
+
+
+def parse_ssml(text, voice_id="", language="", rate=1.0, pitch=1.0):
+    """
+    Breaks SSML down into the segments to speak, supporting <break>,
+    <prosody rate and pitch>, <voice>, <s>, <p>, <sub> and xml:lang.
+    Other elements are spoken as their text. Markup that doesn't parse is
+    spoken with its tags removed.
+    """
+    base = Segment(voice_id=voice_id, language=language, rate=rate, pitch=pitch)
+    try:
+        root = ET.fromstring(text)
+    except ET.ParseError:
+        try:
+            # Fragments without a <speak> root
+            root = ET.fromstring(f"<speak>{text}</speak>")
+        except ET.ParseError as e:
+            print("WARNING: invalid SSML, speaking its text:", e)
+            base.text = _TAG.sub(" ", text)
+            return [base]
+
+    parser = _Parser(base)
+    parser.walk(root, base)
+    for segment in parser.segments:
+        segment.text = " ".join(segment.text.split())
+    return parser.segments
+
+
+def plan_segments(request, voice_for_language=None):
+    """
+    The segments to speak for a request, with its SSML parsed. Segments
+    without a voice get the first one found by `voice_for_language` for
+    their language, or the request's voice.
+    """
+    rate = request.rate or 1.0
+    pitch = request.pitch or 1.0
+    if request.is_ssml:
+        segments = parse_ssml(
+            request.text, request.voice_id, request.language, rate, pitch
+        )
+    else:
+        segments = [
+            Segment(request.text, request.voice_id, request.language, rate, pitch)
+        ]
+
+    found = {}
+
+    def find_voice(language):
+        if not language or not voice_for_language:
+            return None
+        if language not in found:
+            found[language] = voice_for_language(language)
+        return found[language]
+
+    default_voice = request.voice_id or find_voice(request.language) or ""
+    for segment in segments:
+        if segment.text and not segment.voice_id:
+            segment.voice_id = find_voice(segment.language) or default_voice
+    return segments
@@ -0,0 +1,62 @@
+# SPDX-License-Identifer: GPL-3.0-or-later
+
+from gi.repository import GLib
+from dasbus.typing import Dict, Str, Variant, get_variant, Double
+from pathlib import Path
+import os
+import re
+from .metrics import metrics, METRICS_FILE
+
+METRICS_FILE_INTERVAL = int(
+    os.environ.get("SPEECH_PROVIDER_METRICS_FILE_INTERVAL", 10)
+)  # Seconds
+
+
+class StatsInterface(object):
+    """
+    Base for a provider's stats D-Bus interface. Providers subclass it with
+    their own interface name, and implement `collect_stats()` to return a
+    dictionary of dictionaries of numbers or strings by component.
+    """
+
+    def collect_stats(self):
+        return {"metrics": metrics.stats()}
+
+    def _flat_stats(self):
+        for component, stats in self.collect_stats().items():
+            for name, value in stats.items():
+                yield f"{component}.{name}", value
+
+    def GetStats(self) -> Dict[Str, Variant]:
+        return {
+            name: get_variant(Str, value)
+            if isinstance(value, str)
+            else get_variant(Double, float(value))
+            for name, value in self._flat_stats()
+        }
+
+    def start_metrics_file(self, provider_name):
+        """Writes stats to the metrics file, if one is configured."""
+        if not METRICS_FILE:
+            return
+        self._metrics_provider = provider_name
+        self._write_metrics_file()
+        GLib.timeout_add_seconds(METRICS_FILE_INTERVAL, self._write_metrics_file)
+
+    def _write_metrics_file(self):
+        labels = f'provider="{self._metrics_provider}"'
+        lines = []
+        for name, value in self._flat_stats():
+            metric = "speech_provider_" + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+            if isinstance(value, str):
+                lines.append(f'{metric}{{{labels},value="{value}"}} 1')
+            else:
+                lines.append(f"{metric}{{{labels}}} {value}")
+        path = Path(METRICS_FILE)
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            tmp_path.write_text("\n".join(lines) + "\n")
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print("WARNING: failed to write metrics file:", e)
+        return True
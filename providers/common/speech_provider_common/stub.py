@@ -0,0 +1,82 @@
+# SPDX-License-Identifer: GPL-3.0-or-later
+
+from array import array
+import math
+import os
+import sys
+import time
+from .engine import Engine
+from .text import split_sentences
+
+SAMPLE_RATE = 16000
+# Audio made for each character of text
+SECONDS_PER_CHAR = 0.06
+TONE_HZ = 440
+
+
+class StubEngine(Engine):
+    """
+    An engine speaking a tone as long as the text, for exercising the
+    provider framework without models. It pretends synthesis takes
+    `realtime_factor` times as long as the audio.
+    """
+
+    name = "stub"
+    display_name = "Stub"
+
+    def __init__(self, realtime_factor=None):
+        super().__init__()
+        if realtime_factor is None:
+            realtime_factor = float(os.environ.get("STUB_ENGINE_REALTIME_FACTOR", 0))
+        self.realtime_factor = float(realtime_factor)
+        period = SAMPLE_RATE // TONE_HZ
+        self._period = array(
+            "h",
+            (int(8000 * math.sin(2 * math.pi * i / period)) for i in range(period)),
+        )
+        if sys.byteorder != "little":
+            self._period.byteswap()
+
+    def acquire_voice(self, voice_id):
+        if voice_id not in ("", "stub", "stub-slow"):
+            raise ValueError(f"no stub voice {voice_id}")
+        return voice_id or "stub"
+
+    def sample_rate(self, voice):
+        return SAMPLE_RATE
+
+    def _tone(self, seconds):
+        samples = int(SAMPLE_RATE * seconds)
+        periods = samples // len(self._period) + 1
+        return (self._period * periods)[:samples]
+
+    def synthesize(self, voice, request, segment, sample_rate):
+        rate = segment.rate * (0.5 if voice == "stub-slow" else 1)
+        for sentence in split_sentences(segment.text):
+            seconds = len(sentence) * SECONDS_PER_CHAR / rate
+            time.sleep(seconds * self.realtime_factor)
+            yield self._tone(seconds)
+
+    def list_voices(self):
+        audio_format = f"audio/x-raw,format=S16LE,channels=1,rate={SAMPLE_RATE}"
+        return [
+            ("Stub", "stub", audio_format, 0, ["en"]),
+            ("Stub (slow)", "stub-slow", audio_format, 0, ["en-GB"]),
+        ]
+
+
+def main():
+    """Serves the stub engine on the session bus, for benchmarks."""
+    from dasbus.server.interface import dbus_interface
+    from .provider import SpeechProvider, run_provider
+    from .stats import StatsInterface
+
+    @dbus_interface("ai.stub.Speech.Provider.Stats")
+    class StubStats(StatsInterface):
+        pass
+
+    @dbus_interface("org.freedesktop.Speech.Provider")
+    class StubProvider(SpeechProvider, StubStats):
+        pass
+
+    return run_provider(StubProvider, StubEngine(), "ai.stub.Speech.Provider")
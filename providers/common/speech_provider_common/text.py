@@ -0,0 +1,18 @@
+# SPDX-License-Identifer: GPL-3.0-or-later
+
+import re
+
+# A first chunk longer than this is split further at its first clause
+# boundary so the first audio comes out sooner.
+FIRST_CHUNK_LENGTH = 60
+
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?;。！？])\s+|\n\s*\n")
+_CLAUSE_BREAK = re.compile(r"(?<=[,:;—–])\s+")
+
+
+def split_sentences(text):
+    chunks = [chunk.strip() for chunk in _SENTENCE_BREAK.split(text)]
+    chunks = [chunk for chunk in chunks if chunk]
+    if chunks and len(chunks[0]) > FIRST_CHUNK_LENGTH:
+        chunks[0:1] = _CLAUSE_BREAK.split(chunks[0], maxsplit=1)
+    return chunks
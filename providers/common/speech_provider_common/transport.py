@@ -0,0 +1,282 @@
+# SPDX-License-Identifer: GPL-3.0-or-later
+
+import gi
+
+gi.require_version("Gst", "1.0")
+from gi.repository import Gst, GObject, GLib
+from collections import deque
+import itertools
+import os
+import threading
+from time import perf_counter
+from .metrics import metrics
+
+IOV_MAX = os.sysconf("SC_IOV_MAX") if hasattr(os, "sysconf") else 1024
+# Audio queued for a client before synthesis waits for it to catch up
+MAX_QUEUED_BYTES = 256 * 1024
+# Sample format of the pitch element, soundtouch is built for float samples.
+PITCH_FORMAT = "F32LE"
+
+
+def writev_views(fd, views):
+    """
+    Writes a deque of byte memoryviews to fd in as few syscalls as possible,
+    dropping what was written from it. Raises BlockingIOError once a
+    non-blocking fd takes no more.
+    """
+    while views:
+        written = os.writev(fd, list(itertools.islice(views, IOV_MAX)))
+        while written:
+            if written >= views[0].nbytes:
+                written -= views.popleft().nbytes
+            else:
+                views[0] = views[0][written:]
+                written = 0
+
+
+class DirectOutput(GObject.Object):
+    """
+    Writes raw audio straight to the client fd, used when no pitch change
+    is requested so the audio doesn't need to go through GStreamer.
+
+    The fd is non-blocking. What the client doesn't take right away is
+    queued and written from the main loop as the fd becomes writable. The
+    synthesis thread waits while more than `max_queued` bytes are queued, so
+    a slow reader holds back synthesis instead of growing the queue.
+    """
+
+    def __init__(self, fd, max_queued=MAX_QUEUED_BYTES):
+        super().__init__()
+        self._fd = fd
+        self.max_queued = max_queued
+        os.set_blocking(fd, False)
+        self._queue = deque()
+        self._queued = 0
+        self._error = None
+        self._closing = False
+        self._finished = False
+        self._watch_id = 0
+        self._cond = threading.Condition()
+
+    @GObject.Signal
+    def done(self):
+        pass
+
+    def start(self, sample_rate):
+        pass
+
+    def set_pitch(self, pitch):
+        # Only the pitch pipeline changes pitch.
+        pass
+
+    def _flush(self, views):
+        # Writes as much as the fd takes without blocking, dropping what
+        # was written from views.
+        try:
+            writev_views(self._fd, views)
+        except BlockingIOError:
+            pass
+        except OSError as e:
+            self._error = e
+            views.clear()
+        self._queued = sum(view.nbytes for view in self._queue)
+
+    def write(self, *buffers):
+        # Called from the synthesis thread. Takes anything supporting the
+        # buffer protocol, so model output is written as is without first
+        # being copied into bytes. Raises BrokenPipeError once the client
+        # has stopped listening.
+        with self._cond:
+            while self._queued > self.max_queued and not self._error:
+                self._cond.wait()
+            views = deque(memoryview(b).cast("B") for b in buffers)
+            views = deque(view for view in views if view.nbytes)
+            if not self._queue:
+                self._flush(views)
+            if self._error:
+                raise BrokenPipeError(f"client fd: {self._error}")
+            for view in views:
+                # Copied, the caller may be reusing its buffers.
+                self._queue.append(memoryview(bytes(view)))
+            self._queued = sum(view.nbytes for view in self._queue)
+            if self._queue and not self._watch_id:
+                self._watch_id = GLib.unix_fd_add_full(
+                    GLib.PRIORITY_DEFAULT,
+                    self._fd,
+                    GLib.IOCondition.OUT | GLib.IOCondition.ERR | GLib.IOCondition.HUP,
+                    self._on_writable,
+                )
+
+    def _on_writable(self, fd, condition):
+        with self._cond:
+            self._flush(self._queue)
+            self._cond.notify_all()
+            if self._queue:
+                return True
+            self._watch_id = 0
+            finish = self._closing
+        if finish:
+            self._finish()
+        return False
+
+    def close(self):
+        # Called from the synthesis thread, the fd is closed once the queued
+        # audio is written.
+        with self._cond:
+            self._closing = True
+            if self._queue:
+                return
+        GLib.idle_add(self._finish)
+
+    def _finish(self):
+        if self._finished:
+            return False
+        self._finished = True
+        os.close(self._fd)
+        self.emit("done")
+        return False
+
+
+class PitchPipeline(GObject.Object):
+    """
+    A long lived pipeline that pitch shifts audio on its way to the client
+    fd. It is built once and reused by moving between READY and PLAYING.
+    """
+
+    def __init__(self, sample_format="S16LE"):
+        super().__init__()
+        # Only initialized when pitch is first changed to keep it out of
+        # the startup path.
+        Gst.init(None)
+        self.sample_format = sample_format
+        self.pipeline = Gst.Pipeline.new("pitch-pipeline")
+
+        self.source = Gst.ElementFactory.make("appsrc", "source")
+        self.parse = Gst.ElementFactory.make("rawaudioparse", "parse")
+        self.pitch = Gst.ElementFactory.make("pitch", "pitch")
+        self.caps_filter = Gst.ElementFactory.make("capsfilter", "audioconvert_filter")
+        self.sink = Gst.ElementFactory.make("fdsink", "sink")
+        self.sink.set_property("sync", False)
+
+        # Block the synthesis thread when the client is slow to read.
+        self.source.set_property("block", True)
+        self.source.set_property("max-bytes", 64 * 1024)
+
+        # The pitch element works on float samples, audio in any other
+        # format is converted there and back.
+        if sample_format == PITCH_FORMAT:
+            elements = [self.source, self.parse, self.pitch, self.caps_filter, self.sink]
+        else:
+            elements = [
+                self.source,
+                self.parse,
+                Gst.ElementFactory.make("audioconvert", "convert"),
+                self.pitch,
+                Gst.ElementFactory.make("audioconvert", "convert2"),
+                self.caps_filter,
+                self.sink,
+            ]
+
+        for el in elements:
+            self.pipeline.add(el)
+
+        for index in range(1, len(elements)):
+            elements[index - 1].link(elements[index])
+
+        self.parse.set_property("num-channels", 1)
+        Gst.util_set_object_arg(self.parse, "pcm-format", sample_format.lower())
+        self.pitch.set_property("pitch", 1)
+        self._active = False
+        self._started = False
+        # Pitch changes as (stream time, pitch), applied as the audio
+        # written after them reaches the pitch element.
+        self._pitch_changes = deque()
+        self._bytes_per_second = 0
+        self._written = 0
+        self.pitch.get_static_pad("sink").add_probe(
+            Gst.PadProbeType.BUFFER, self._on_pitch_buffer
+        )
+
+        bus = self.pipeline.get_bus()
+        bus.add_signal_watch()
+        bus.connect("message::error", self.on_eos_or_end)
+        bus.connect("message::eos", self.on_eos_or_end)
+
+    @GObject.Signal
+    def done(self):
+        pass
+
+    def open(self, fd, pitch):
+        self.sink.set_property("fd", fd)
+        self.pitch.set_property("pitch", pitch)
+        self._pitch_changes.clear()
+        self._written = 0
+        self._active = True
+
+    def start(self, sample_rate):
+        # Called from the synthesis thread
+        self.parse.set_property("sample-rate", sample_rate)
+        self.caps_filter.set_property(
+            "caps",
+            Gst.caps_from_string(
+                f"audio/x-raw,format={self.sample_format},channels=1,rate={sample_rate}"
+            ),
+        )
+        sample_size = 4 if self.sample_format == PITCH_FORMAT else 2
+        self._bytes_per_second = sample_rate * sample_size
+        self._started = True
+        self.pipeline.set_state(Gst.State.PLAYING)
+
+    def set_pitch(self, pitch):
+        # Called from the synthesis thread, applies to what is written next.
+        position = self._written * Gst.SECOND // self._bytes_per_second
+        self._pitch_changes.append((position, pitch))
+
+    def _on_pitch_buffer(self, pad, info):
+        # Called from the streaming thread
+        pts = info.get_buffer().pts
+        while self._pitch_changes and self._pitch_changes[0][0] <= pts:
+            self.pitch.set_property("pitch", self._pitch_changes.popleft()[1])
+        return Gst.PadProbeReturn.OK
+
+    def write(self, *buffers):
+        data = b"".join(buffers) if len(buffers) > 1 else bytes(buffers[0])
+        self._written += len(data)
+        ret = self.source.emit("push-buffer", Gst.Buffer.new_wrapped(data))
+        if ret != Gst.FlowReturn.OK:
+            # Stopped by an error, usually the client closing its end.
+            raise BrokenPipeError(f"pitch pipeline stopped ({ret.value_nick})")
+
+    def close(self):
+        # Called from the synthesis thread
+        if self._started:
+            self.source.emit("end-of-stream")
+        else:
+            GLib.idle_add(self._finish)
+
+    def shutdown(self):
+        self.pipeline.get_bus().remove_signal_watch()
+        self.pipeline.set_state(Gst.State.NULL)
+
+    def on_eos_or_end(self, bus, msg):
+        if msg.type == Gst.MessageType.ERROR:
+            metrics.count("pipeline-errors")
+            err, dbg = msg.parse_error()
+            print("ERROR:", msg.src.get_name(), ":", err.message)
+            if dbg:
+                print("Debug info:", dbg)
+
+        self._finish()
+
+    def _finish(self):
+        if not self._active:
+            return False
+        self._active = False
+        self._started = False
+        start = perf_counter()
+        self.pipeline.set_state(Gst.State.READY)
+        metrics.observe("pipeline-teardown-seconds", perf_counter() - start)
+        os.close(self.sink.get_property("fd"))
+        self.pitch.set_property("pitch", 1)
+        self.emit("done")
+        return False
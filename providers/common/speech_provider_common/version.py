@@ -0,0 +1,3 @@
+# SPDX-License-Identifer: GPL-3.0-or-later
+
+__version__ = '0.1'
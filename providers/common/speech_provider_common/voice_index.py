@@ -0,0 +1,119 @@
+# SPDX-License-Identifer: GPL-3.0-or-later
+
+from gi.repository import Gio, GLib, GObject
+from pathlib import Path
+import json
+
+# Installing a voice touches several files, wait for things to settle
+# before rebuilding the list.
+SETTLE_MILLISECONDS = 500
+
+
+class VoiceIndex(GObject.Object):
+    """
+    Caches the voice list returned by `build`, and rebuilds it when one of
+    the given directories, or a directory directly in them, changes.
+
+    When given a cache name, the list is also kept on disk and reused by
+    the next process as long as the directories are unchanged.
+    """
+
+    def __init__(self, build, directories, cache_name=None):
+        super().__init__()
+        self._build = build
+        self._directories = [Path(d) for d in directories]
+        self._voices = None
+        self._settle_id = 0
+        self._monitors = []
+        self._cache_path = None
+        if cache_name:
+            self._cache_path = Path(GLib.get_user_cache_dir()) / cache_name / "voices.json"
+        self._watch()
+
+    @GObject.Signal
+    def changed(self):
+        pass
+
+    def _watched_directories(self):
+        for directory in self._directories:
+            yield directory
+            if directory.is_dir():
+                yield from sorted(d for d in directory.iterdir() if d.is_dir())
+
+    def _watch(self):
+        for monitor in self._monitors:
+            monitor.cancel()
+        self._monitors = []
+        for directory in self._watched_directories():
+            monitor = Gio.File.new_for_path(str(directory)).monitor_directory(
+                Gio.FileMonitorFlags.WATCH_MOVES, None
+            )
+            monitor.connect("changed", self._on_directory_changed)
+            self._monitors.append(monitor)
+
+    def _stamp(self):
+        return [
+            [str(directory), directory.stat().st_mtime_ns]
+            for directory in self._watched_directories()
+            if directory.is_dir()
+        ]
+
+    @property
+    def voices(self):
+        if self._voices is None:
+            self._voices = self._load() or self._build()
+            self._store()
+        return self._voices
+
+    def voice_for_language(self, language):
+        """
+        The id of a voice speaking the given language, preferring an exact
+        match of the tag over one of its primary language. None if no
+        voice speaks it.
+        """
+        wanted = language.replace("_", "-").lower()
+        primary = wanted.split("-")[0]
+        fallback = None
+        for _name, voice_id, _format, _features, languages in self.voices:
+            for voice_language in languages:
+                voice_language = voice_language.replace("_", "-").lower()
+                if voice_language == wanted:
+                    return voice_id
+                if fallback is None and voice_language.split("-")[0] == primary:
+                    fallback = voice_id
+        return fallback
+
+    def _load(self):
+        if not self._cache_path:
+            return None
+        try:
+            cached = json.loads(self._cache_path.read_text())
+        except (OSError, ValueError):
+            return None
+        if cached.get("stamp") != self._stamp():
+            return None
+        return [tuple(voice) for voice in cached["voices"]]
+
+    def _store(self):
+        if not self._cache_path:
+            return
+        try:
+            self._cache_path.parent.mkdir(parents=True, exist_ok=True)
+            self._cache_path.write_text(
+                json.dumps({"stamp": self._stamp(), "voices": self._voices})
+            )
+        except OSError as e:
+            print("WARNING: failed to store voice list:", e)
+
+    def _on_directory_changed(self, monitor, file, other_file, event_type):
+        if self._settle_id:
+            GLib.source_remove(self._settle_id)
+        self._settle_id = GLib.timeout_add(SETTLE_MILLISECONDS, self._invalidate)
+
+    def _invalidate(self):
+        self._settle_id = 0
+        self._voices = None
+        # New language directories may have appeared.
+        self._watch()
+        self.emit("changed")
+        return False
@@ -0,0 +1,158 @@
+# SPDX-License-Identifer: GPL-3.0-or-later
+
+from speech_provider_common.engine import Engine
+from speech_provider_common.metrics import span
+from speech_provider_common.text import split_sentences
+import os
+import threading
+from .pool import SystemPool, DEFAULT_MAX_VOICES, new_mimic3, split_voice_id
+
+SAMPLE_RATE = 22050
+SYNTH_CONCURRENCY = int(
+    os.environ.get("MIMIC3_SYNTH_CONCURRENCY", os.cpu_count() or 1)
+)
+MAX_WORKERS = int(os.environ.get("MIMIC3_MAX_WORKERS", max(5, SYNTH_CONCURRENCY)))
+MAX_LOADED_VOICES = int(os.environ.get("MIMIC3_MAX_LOADED_VOICES", DEFAULT_MAX_VOICES))
+# Voices popular in previous sessions loaded on startup
+PRELOAD_VOICES = int(os.environ.get("MIMIC3_PRELOAD_VOICES", 2))
+
+
+class Mimic3Engine(Engine):
+    name = "mimic3"
+    display_name = "Mimic 3"
+    max_workers = MAX_WORKERS
+    cache_voices = True
+
+    _synth_slots = threading.BoundedSemaphore(SYNTH_CONCURRENCY)
+
+    def __init__(self):
+        super().__init__()
+        self.pool = SystemPool(MAX_LOADED_VOICES)
+        # Only for listing voices
+        self._mimic3 = None
+        self._mimic3_lock = threading.Lock()
+
+    @property
+    def mimic3(self):
+        with self._mimic3_lock:
+            if not self._mimic3:
+                self._mimic3 = new_mimic3()
+            return self._mimic3
+
+    def acquire_voice(self, voice_id):
+        return self.pool.acquire(voice_id)
+
+    def release_voice(self, voice_id, voice):
+        self.pool.release(voice_id, voice)
+
+    def sample_rate(self, voice):
+        return SAMPLE_RATE
+
+    def synthesize(self, mimic3, request, segment, sample_rate):
+        mimic3.rate = segment.rate
+        # Synthesize a sentence at a time so the first one can be heard
+        # while the rest are computed.
+        for sentence in split_sentences(segment.text):
+            with self._synth_slots:
+                with span(request, "phonemize"):
+                    self._speak_sentence(mimic3, segment.voice_id, sentence)
+                with span(request, "inference"):
+                    results = list(mimic3.end_utterance())
+            for result in results:
+                yield result.audio_bytes
+
+    def _speak_sentence(self, mimic3, voice_id, sentence):
+        # Queues the sentence's phonemes, from the cache if it was spoken
+        # with this voice before. They are kept as plain data, the settings
+        # in effect now are applied when they are replayed.
+        from copy import deepcopy
+        from mimic3_tts.tts import Mimic3Phonemes
+        from opentts_abc import AudioResult
+
+        voice_key, _speaker = split_voice_id(voice_id)
+        mimic3.begin_utterance()
+        cached = self.phoneme_cache.get(voice_key, sentence)
+        if cached is None:
+            mimic3.speak_text(sentence)
+            cached = []
+            for result in mimic3._results:
+                if isinstance(result, Mimic3Phonemes):
+                    cached.append(["phonemes", result.phonemes, result.is_utterance])
+                else:
+                    cached.append(["break", len(result.audio_bytes)])
+            self.phoneme_cache.put(voice_key, sentence, cached)
+            return
+
+        for entry in cached:
+            if entry[0] == "phonemes":
+                mimic3._results.append(
+                    Mimic3Phonemes(
+                        current_settings=deepcopy(mimic3.settings),
+                        phonemes=entry[1],
+                        is_utterance=entry[2],
+                    )
+                )
+            else:
+                mimic3._results.append(
+                    AudioResult(
+                        sample_rate_hz=mimic3.settings.sample_rate,
+                        audio_bytes=bytes(entry[1]),
+                        sample_width_bytes=2,
+                        num_channels=1,
+                    )
+                )
+
+    def voice_directories(self):
+        import mimic3_tts
+        from mimic3_tts.const import DEFAULT_VOICES_DOWNLOAD_DIR
+
+        directories = mimic3_tts.Mimic3TextToSpeechSystem.get_default_voices_directories()
+        directories.append(DEFAULT_VOICES_DOWNLOAD_DIR)
+        return directories
+
+    def list_voices(self):
+        import langcodes
+
+        voices = []
+        for v in self.mimic3.get_voices():
+            # if v.location.startswith("/"):
+            if True:
+                lang_tag = langcodes.standardize_tag(v.language)
+                lang_desc = langcodes.Language.get(lang_tag).display_name()
+                if not v.speakers:
+                    voices.append(
+                        (
+                            f"{v.name} - {lang_desc}",
+                            v.key,
+                            f"audio/x-raw,format=S16LE,channels=1,rate={SAMPLE_RATE}",
+                            0,
+                            [lang_tag],
+                        )
+                    )
+                else:
+                    for speaker in v.speakers:
+                        voices.append(
+                            (
+                                f"{v.name}/{speaker} - {lang_desc}",
+                                f"{v.key}#{speaker}",
+                                f"audio/x-raw,format=S16LE,channels=1,rate={SAMPLE_RATE}",
+                                0,
+                                [v.language],
+                            )
+                        )
+        return voices
+
+    def preload(self):
+        self.pool.preload(self.pool.popular(PRELOAD_VOICES) or [""])
+
+    def release(self):
+        self.pool.clear()
+        self.pool.save_usage()
+        with self._mimic3_lock:
+            self._mimic3 = None
+
+    def save(self):
+        self.pool.save_usage()
+
+    def stats(self):
+        return {"voice-pool": self.pool.stats()}
@@ -0,0 +1,172 @@
+# SPDX-License-Identifer: GPL-3.0-or-later
+
+from collections import OrderedDict
+from gi.repository import GLib
+from pathlib import Path
+import json
+import threading
+
+DEFAULT_MAX_VOICES = 4
+# Idle systems kept per voice, for concurrent requests using the same voice.
+MAX_IDLE_SYSTEMS = 2
+
+
+def new_mimic3(voice_key=None):
+    # mimic3_tts pulls in onnxruntime and friends, only import it once it
+    # is needed so the bus name can be owned quickly.
+    import mimic3_tts
+
+    system = mimic3_tts.Mimic3TextToSpeechSystem(mimic3_tts.Mimic3Settings())
+    if voice_key:
+        system.voice = voice_key
+    return system
+
+
+def split_voice_id(voice_id):
+    """Splits a "key#speaker" voice id into the voice key and speaker."""
+    from mimic3_tts.const import DEFAULT_VOICE
+
+    voice_key, _, speaker = (voice_id or DEFAULT_VOICE).partition("#")
+    return voice_key, speaker or None
+
+
+class _PooledVoice(object):
+    def __init__(self):
+        self.idle = []
+        self.users = 0
+        self.model = None
+
+
+class SystemPool(object):
+    """
+    Mimic 3 TTS systems by voice, so requests for different voices can
+    synthesize concurrently without switching a shared system between them.
+
+    Systems of the same voice share its model. The least recently used
+    voices that aren't in use are unloaded once more than `max_voices` are
+    loaded. How often each voice is used is kept across sessions, so the
+    popular ones can be loaded ahead of time.
+    """
+
+    def __init__(self, max_voices=DEFAULT_MAX_VOICES, state_name="speech-provider-mimic3"):
+        self.max_voices = max_voices
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._voices = OrderedDict()
+        self._lock = threading.Lock()
+        self._usage_path = Path(GLib.get_user_state_dir()) / state_name / "voice-usage.json"
+        try:
+            self._usage = json.loads(self._usage_path.read_text())
+        except (OSError, ValueError):
+            self._usage = {}
+        self._usage_dirty = False
+
+    def acquire(self, voice_id, record_usage=True):
+        """Returns a system set to the given voice, to be released after use."""
+        voice_key, speaker = split_voice_id(voice_id)
+        with self._lock:
+            pooled = self._voices.get(voice_key)
+            if not pooled:
+                pooled = self._voices[voice_key] = _PooledVoice()
+            self._voices.move_to_end(voice_key)
+            pooled.users += 1
+            if record_usage:
+                self._usage[voice_key] = self._usage.get(voice_key, 0) + 1
+                self._usage_dirty = True
+            system = pooled.idle.pop() if pooled.idle else None
+            if system:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if not system:
+            system = new_mimic3(voice_key)
+            try:
+                # Loads the model, or shares it with this voice's other systems.
+                system.preload_voice(voice_key)
+            except Exception:
+                self._release_voice(voice_key)
+                raise
+            # Remembered so the model can be dropped from mimic3's shared
+            # models when the voice is evicted.
+            pooled.model = system._loaded_voices[voice_key].onnx_model
+
+        system.speaker = speaker
+        return system
+
+    def release(self, voice_id, system):
+        voice_key, _speaker = split_voice_id(voice_id)
+        with self._lock:
+            pooled = self._voices.get(voice_key)
+            if pooled and len(pooled.idle) < MAX_IDLE_SYSTEMS:
+                pooled.idle.append(system)
+        self._release_voice(voice_key)
+
+    def _release_voice(self, voice_key):
+        with self._lock:
+            pooled = self._voices.get(voice_key)
+            if pooled:
+                pooled.users -= 1
+            self._evict()
+
+    def _evict(self):
+        for voice_key, pooled in list(self._voices.items()):
+            if len(self._voices) <= self.max_voices:
+                break
+            if not pooled.users:
+                self._remove(voice_key)
+
+    def _remove(self, voice_key):
+        pooled = self._voices.pop(voice_key)
+        self.evictions += 1
+        if pooled.model is None:
+            return
+        from mimic3_tts.voice import Mimic3Voice
+
+        with Mimic3Voice._SHARED_MODELS_LOCK:
+            for model_key, model in list(Mimic3Voice._SHARED_MODELS.items()):
+                if model is pooled.model:
+                    del Mimic3Voice._SHARED_MODELS[model_key]
+
+    def clear(self):
+        """Unloads all the voices that aren't in use."""
+        with self._lock:
+            for voice_key, pooled in list(self._voices.items()):
+                if not pooled.users:
+                    self._remove(voice_key)
+
+    def popular(self, count):
+        """The voices used the most in this and previous sessions."""
+        with self._lock:
+            return sorted(self._usage, key=self._usage.get, reverse=True)[:count]
+
+    def preload(self, voice_ids):
+        for voice_id in voice_ids:
+            try:
+                self.release(voice_id, self.acquire(voice_id, record_usage=False))
+            except Exception as e:
+                print(f"WARNING: failed to preload voice {voice_id}:", e)
+
+    def save_usage(self):
+        with self._lock:
+            if not self._usage_dirty:
+                return
+            usage = dict(self._usage)
+            self._usage_dirty = False
+        try:
+            self._usage_path.parent.mkdir(parents=True, exist_ok=True)
+            self._usage_path.write_text(json.dumps(usage))
+        except OSError as e:
+            print("WARNING: failed to store voice usage:", e)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "voices": len(self._voices),
+                "max-voices": self.max_voices,
+                "idle-systems": sum(len(p.idle) for p in self._voices.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
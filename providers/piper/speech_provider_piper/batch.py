@@ -0,0 +1,87 @@
+# SPDX-License-Identifer: GPL-3.0-or-later
+
+import os
+import threading
+from speech_provider_common.metrics import metrics
+from .synth import infer_batch
+
+# Off unless a window is given, batching trades a little latency on the
+# first request of a burst for throughput on the rest.
+BATCH_WINDOW = int(os.environ.get("PIPER_BATCH_WINDOW_MS", 0)) / 1000
+MAX_BATCH_SIZE = int(os.environ.get("PIPER_MAX_BATCH_SIZE", 8))
+# Longer sentences are worth a pass of their own, and padding everything
+# else in the batch to their length would waste work.
+MAX_BATCH_PHONEMES = int(os.environ.get("PIPER_MAX_BATCH_PHONEMES", 96))
+
+
+class _Batch(object):
+    def __init__(self):
+        self.items = []
+        self.results = None
+        self.error = None
+        self.closed = False
+        self.ready = threading.Event()
+
+
+class Batcher(object):
+    """
+    Coalesces inferences of short sentences that arrive for the same voice
+    within a small window into one model call.
+
+    The first caller of a batch waits for the window to pass or the batch
+    to fill, runs it, and hands each caller its own audio, trimmed of the
+    padding to the longest item like audio inferred alone.
+    """
+
+    def __init__(self, slots, window=BATCH_WINDOW, max_size=MAX_BATCH_SIZE):
+        self._slots = slots
+        self.window = window
+        self.max_size = max_size
+        self._lock = threading.Condition()
+        self._open = {}
+
+    def can_batch(self, phoneme_ids):
+        return self.window > 0 and len(phoneme_ids) <= MAX_BATCH_PHONEMES
+
+    def infer(self, voice, phoneme_ids, length_scale):
+        # Scales are per call, only sentences with the same ones can share.
+        key = (id(voice), length_scale)
+        with self._lock:
+            batch = self._open.get(key)
+            leader = batch is None
+            if leader:
+                batch = self._open[key] = _Batch()
+            index = len(batch.items)
+            batch.items.append(phoneme_ids)
+            if len(batch.items) >= self.max_size:
+                self._close(key, batch)
+                self._lock.notify_all()
+
+        if not leader:
+            batch.ready.wait()
+            if batch.error:
+                raise batch.error
+            return batch.results[index]
+
+        with self._lock:
+            self._lock.wait_for(lambda: batch.closed, self.window)
+            self._close(key, batch)
+
+        try:
+            with self._slots:
+                batch.results = self._run(voice, batch.items, length_scale)
+        except Exception as e:
+            batch.error = e
+            raise
+        finally:
+            batch.ready.set()
+        return batch.results[0]
+
+    def _close(self, key, batch):
+        batch.closed = True
+        if self._open.get(key) is batch:
+            del self._open[key]
+
+    def _run(self, voice, items, length_scale):
+        metrics.observe("batch-size", len(items))
+        return infer_batch(voice, items, length_scale)
@@ -0,0 +1,82 @@
+# SPDX-License-Identifer: GPL-3.0-or-later
+#
+# Converts voice models so their weights are kept in a separate file that
+# onnxruntime maps into memory instead of reading, letting processes share
+# the pages:
+#
+#   python3 -m speech_provider_piper.convert /app/share/piper/voices
+
+from pathlib import Path
+import os
+import sys
+import tempfile
+import time
+
+# Converted models live in this subdirectory of the voices directory
+SHARED_DIR = "shared"
+
+
+def shared_model_path(model_path, directory=None):
+    model_path = Path(model_path)
+    return Path(directory or model_path.parent / SHARED_DIR) / model_path.name
+
+
+def convert(model_path, out_path):
+    # Not needed at runtime unless models are converted on the fly.
+    import onnx
+
+    model = onnx.load(str(model_path))
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    started = time.time()
+    # Every conversion writes a data file of its own, onnx appends to an
+    # existing one, and processes may have the previous one mapped or be
+    # converting the same model.
+    fd, data_path = tempfile.mkstemp(
+        prefix=f"{out_path.name}.", suffix=".data", dir=out_path.parent
+    )
+    os.close(fd)
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=f"{out_path.name}.", suffix=".tmp", dir=out_path.parent
+    )
+    os.close(fd)
+    data_path, tmp_path = Path(data_path), Path(tmp_path)
+    try:
+        onnx.save_model(
+            model,
+            str(tmp_path),
+            save_as_external_data=True,
+            all_tensors_to_one_file=True,
+            location=data_path.name,
+            size_threshold=1024,
+        )
+        for path in (data_path, tmp_path):
+            path.chmod(0o644)
+        # The data file is complete before the model referring to it appears.
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        for path in (data_path, tmp_path):
+            path.unlink(missing_ok=True)
+        raise
+
+    # Data of earlier conversions, mappings of it stay valid after unlinking.
+    # Newer files may belong to a conversion still running.
+    for stale_path in out_path.parent.glob(f"{out_path.name}*.data"):
+        try:
+            if stale_path != data_path and stale_path.stat().st_mtime < started:
+                stale_path.unlink()
+        except FileNotFoundError:
+            pass
+    return out_path
+
+
+def main(argv=sys.argv):
+    voices_dir = Path(argv[1])
+    for model_path in sorted(voices_dir.glob("*.onnx")):
+        out_path = shared_model_path(model_path)
+        print(f"{model_path.name} -> {out_path}")
+        convert(model_path, out_path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+# SPDX-License-Identifer: GPL-3.0-or-later
+
+from gi.repository import GLib
+from pathlib import Path
+from speech_provider_common.engine import Engine
+from speech_provider_common.metrics import span
+from speech_provider_common.text import split_sentences
+import json
+import os
+import threading
+from .voice_cache import VoiceCache, DEFAULT_MAX_BYTES
+from .tiers import QualityTiers
+
+CPU_COUNT = os.cpu_count() or 1
+SYNTH_CONCURRENCY = int(os.environ.get("PIPER_SYNTH_CONCURRENCY", CPU_COUNT))
+# Each inference uses all cores like onnxruntime does by default, single
+# requests are what screen readers mostly make. With the concurrency set
+# the cores are shared out between the inferences instead.
+INTRA_OP_THREADS = (
+    max(1, CPU_COUNT // SYNTH_CONCURRENCY)
+    if "PIPER_SYNTH_CONCURRENCY" in os.environ
+    else 0
+)
+MAX_WORKERS = int(os.environ.get("PIPER_MAX_WORKERS", max(5, SYNTH_CONCURRENCY)))
+# The models produce float samples, clients that accept them natively spare
+# us and themselves a conversion.
+SAMPLE_FORMAT = os.environ.get("PIPER_SAMPLE_FORMAT", "S16LE").upper()
+if SAMPLE_FORMAT not in ("S16LE", "F32LE"):
+    print(f"WARNING: unsupported sample format {SAMPLE_FORMAT}, using S16LE")
+    SAMPLE_FORMAT = "S16LE"
+
+
+class PiperEngine(Engine):
+    name = "piper"
+    display_name = "Piper"
+    sample_format = SAMPLE_FORMAT
+    max_workers = MAX_WORKERS
+
+    # ONNX sessions are safe to run concurrently, we only bound how many
+    # inferences run at once.
+    _synth_slots = threading.BoundedSemaphore(SYNTH_CONCURRENCY)
+
+    def __init__(self, default_voices_dir):
+        super().__init__()
+        self.voices_dir = Path(os.environ.get("PIPER_VOICES_DIR", default_voices_dir))
+        if not self.voices_dir.is_absolute():
+            self.voices_dir = Path.cwd() / self.voices_dir
+        self.voice_cache = VoiceCache(
+            self.voices_dir,
+            int(os.environ.get("PIPER_VOICE_CACHE_BYTES", DEFAULT_MAX_BYTES)),
+            INTRA_OP_THREADS,
+        )
+        self.tiers = QualityTiers(self._voice_ids)
+        # Shared by all requests so their short sentences can be batched
+        # together, created with the first so numpy stays out of startup.
+        self._batcher = None
+        self._batcher_lock = threading.Lock()
+        self._local = threading.local()
+
+    def _voice_ids(self):
+        return sorted(path.stem for path in self.voices_dir.glob("*.onnx"))
+
+    def _get_batcher(self):
+        with self._batcher_lock:
+            if not self._batcher:
+                from .batch import Batcher
+
+                self._batcher = Batcher(self._synth_slots)
+            return self._batcher
+
+    def _sample_buffer(self):
+        # Each synthesis thread reuses its own conversion buffer.
+        samples = getattr(self._local, "samples", None)
+        if samples is None:
+            from .synth import SampleBuffer
+
+            samples = self._local.samples = SampleBuffer()
+        return samples
+
+    def acquire_voice(self, voice_id):
+        return self.voice_cache.acquire(voice_id)
+
+    def release_voice(self, voice_id, voice):
+        self.voice_cache.release(voice_id)
+
+    def sample_rate(self, voice):
+        return voice.config.sample_rate
+
+    def synthesize(self, voice, request, segment, sample_rate):
+        from .synth import phonemize, infer, resample
+
+        batcher = self._get_batcher()
+        samples = self._sample_buffer()
+        length_scale = voice.config.length_scale / segment.rate
+        for sentence in split_sentences(segment.text):
+            with span(request, "phonemize"):
+                sentence_ids = self.phoneme_cache.get(segment.voice_id, sentence)
+                if sentence_ids is None:
+                    sentence_ids = [
+                        voice.phonemes_to_ids(phonemes)
+                        for phonemes in phonemize(voice, sentence)
+                    ]
+                    self.phoneme_cache.put(segment.voice_id, sentence, sentence_ids)
+            for phoneme_ids in sentence_ids:
+                with span(request, "inference"):
+                    if batcher.can_batch(phoneme_ids):
+                        audio = batcher.infer(voice, phoneme_ids, length_scale)
+                    else:
+                        with self._synth_slots:
+                            audio = infer(voice, phoneme_ids, length_scale)
+                audio = resample(audio, voice.config.sample_rate, sample_rate)
+                yield samples.convert(audio, SAMPLE_FORMAT)
+
+    def list_voices(self):
+        voices = []
+        for voice_config in self.voices_dir.glob("*.onnx.json"):
+            config = json.loads(voice_config.read_text())
+            dataset = config["dataset"]
+            name_native = config["language"]["name_native"]
+            identifier = voice_config.stem[:-5]
+            languages = [config["language"]["code"].replace("_", "-")]
+            sample_rate = config["audio"]["sample_rate"]
+            voices.append(
+                (
+                    f"{dataset} ({name_native})",
+                    identifier,
+                    f"audio/x-raw,format={SAMPLE_FORMAT},channels=1,rate={sample_rate}",
+                    0,
+                    languages,
+                )
+            )
+        return voices
+
+    def voice_directories(self):
+        return [self.voices_dir]
+
+    def faster_segments(self, segments):
+        return self.tiers.downgrade(segments)
+
+    def _default_voice(self):
+        for language in GLib.get_language_names():
+            for voice_id in self._voice_ids():
+                voice_language = voice_id.split("-")[0]
+                if language in (voice_language, voice_language.split("_")[0]):
+                    return voice_id
+        return None
+
+    def preload(self):
+        voice_id = os.environ.get("PIPER_DEFAULT_VOICE") or self._default_voice()
+        if not voice_id:
+            return
+        # Get the imports the first synthesis needs out of the way too.
+        from . import synth
+
+        try:
+            self.voice_cache.acquire(voice_id)
+        except Exception as e:
+            print(f"WARNING: failed to preload voice {voice_id}:", e)
+            return
+        self.voice_cache.release(voice_id)
+
+    def release(self):
+        self.voice_cache.clear()
+
+    def stats(self):
+        return {
+            "voice-cache": self.voice_cache.stats(),
+            "quality-tiers": self.tiers.stats(),
+        }
@@ -0,0 +1,124 @@
+# SPDX-License-Identifer: GPL-3.0-or-later
+
+import numpy as np
+import threading
+
+MAX_WAV_VALUE = 32767.0
+# Output this far below a sentence's peak is silence, or padding up to the
+# longest sentence of a batch.
+SILENCE_DB = -60
+# Silence kept after the last sound, the pause between sentences.
+TAIL_SECONDS = 0.15
+
+# espeak-ng keeps global state, phonemization can't run concurrently.
+_phonemize_lock = threading.Lock()
+
+
+def phonemize(voice, text):
+    with _phonemize_lock:
+        return voice.phonemize(text)
+
+
+def infer(voice, phoneme_ids, length_scale, speaker_id=None):
+    """
+    Runs the model on one sentence, like PiperVoice.synthesize_ids_to_raw()
+    but returning the model's float samples as they are.
+    """
+    return infer_batch(voice, [phoneme_ids], length_scale, speaker_id)[0]
+
+
+def infer_batch(voice, phoneme_ids_list, length_scale, speaker_id=None):
+    """
+    Runs the model on several sentences at once. Shorter sentences are
+    padded, so every sentence's audio is trimmed of trailing silence, alike
+    whether it was run alone or not.
+    """
+    config = voice.config
+    phoneme_ids_lengths = np.array([len(ids) for ids in phoneme_ids_list], dtype=np.int64)
+    phoneme_ids_array = np.zeros(
+        (len(phoneme_ids_list), phoneme_ids_lengths.max()), dtype=np.int64
+    )
+    for row, phoneme_ids in zip(phoneme_ids_array, phoneme_ids_list):
+        row[: len(phoneme_ids)] = phoneme_ids
+    scales = np.array(
+        [config.noise_scale, length_scale, config.noise_w], dtype=np.float32
+    )
+    if config.num_speakers > 1 and speaker_id is None:
+        speaker_id = 0
+    sid = None
+    if speaker_id is not None:
+        sid = np.full(len(phoneme_ids_list), speaker_id, dtype=np.int64)
+
+    audio = voice.session.run(
+        None,
+        {
+            "input": phoneme_ids_array,
+            "input_lengths": phoneme_ids_lengths,
+            "scales": scales,
+            "sid": sid,
+        },
+    )[0]
+    return [
+        trim(item, config.sample_rate)
+        for item in audio.reshape(len(phoneme_ids_list), -1)
+    ]
+
+
+def trim(audio, sample_rate):
+    magnitude = np.abs(audio)
+    peak = magnitude.max() if magnitude.size else 0
+    loud = np.flatnonzero(magnitude > peak * 10 ** (SILENCE_DB / 20))
+    if not loud.size:
+        return audio[:0]
+    end = loud[-1] + 1 + int(TAIL_SECONDS * sample_rate)
+    if end > audio.size:
+        # The same length as when padded in a batch
+        return np.concatenate([audio, np.zeros(end - audio.size, dtype=audio.dtype)])
+    return audio[:end]
+
+
+class SampleBuffer(object):
+    """
+    Scratch space for converting model output to 16 bit samples, reused
+    from one sentence to the next. A converted sentence is only valid until
+    the next one is converted.
+    """
+
+    def __init__(self):
+        self._samples = np.empty(0, dtype=np.int16)
+
+    def convert(self, audio, sample_format="S16LE"):
+        if sample_format == "F32LE":
+            return normalize(audio)
+        return self.to_int16(audio)
+
+    def to_int16(self, audio):
+        # Same normalization as piper.util.audio_float_to_int16(), done in
+        # place instead of through temporary arrays.
+        if self._samples.size < audio.size:
+            self._samples = np.empty(audio.size, dtype=np.int16)
+        samples = self._samples[: audio.size]
+        np.multiply(audio, MAX_WAV_VALUE / max(0.01, np.max(np.abs(audio))), out=audio)
+        np.clip(audio, -MAX_WAV_VALUE, MAX_WAV_VALUE, out=audio)
+        np.copyto(samples, audio, casting="unsafe")
+        return samples
+
+
+def normalize(audio):
+    """Scales float model output in place like convert(), but keeps it float."""
+    peak = max(0.01, np.max(np.abs(audio)))
+    np.multiply(audio, 1 / peak, out=audio)
+    np.clip(audio, -1.0, 1.0, out=audio)
+    return audio
+
+
+def resample(audio, from_rate, to_rate):
+    """
+    Linearly resamples float model output, for switching to a voice with
+    another sample rate in the middle of a stream.
+    """
+    if from_rate == to_rate:
+        return audio
+    length = int(len(audio) * to_rate / from_rate)
+    positions = np.arange(length, dtype=np.float32) * (from_rate / to_rate)
+    return np.interp(positions, np.arange(len(audio)), audio).astype(np.float32)
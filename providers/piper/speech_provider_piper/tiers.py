@@ -0,0 +1,88 @@
+# SPDX-License-Identifer: GPL-3.0-or-later
+
+import copy
+import os
+import threading
+
+# Serve requests with a lower quality voice of the same speaker while the
+# provider is under load. Only voices with such a sibling installed are
+# switched, none of the voices the flatpak ships has one.
+QUALITY_TIERING = bool(os.environ.get("PIPER_QUALITY_TIERING"))
+# Also switch to another speaker of the same language when the speaker has
+# no lower quality, an audible change of voice.
+OTHER_SPEAKERS = bool(os.environ.get("PIPER_QUALITY_TIERING_OTHER_SPEAKERS"))
+# Piper voice qualities from fastest to best
+QUALITIES = ["x_low", "low", "medium", "high"]
+
+
+def parse_voice_id(voice_id):
+    """Splits a "language-name-quality" voice id, None if it isn't one."""
+    language, _, rest = voice_id.partition("-")
+    name, _, quality = rest.rpartition("-")
+    if not name or quality not in QUALITIES:
+        return None
+    return language, name, QUALITIES.index(quality)
+
+
+class QualityTiers(object):
+    """
+    Swaps voices for a faster sibling, used while the provider is under
+    load: the next lower quality of the same speaker, or with
+    `other_speakers` of another speaker of the same language when there is
+    none. `voice_ids` returns the installed voices.
+    """
+
+    def __init__(
+        self, voice_ids, enabled=QUALITY_TIERING, other_speakers=OTHER_SPEAKERS
+    ):
+        self._voice_ids = voice_ids
+        self.enabled = enabled
+        self.other_speakers = other_speakers
+        self.downgraded = 0
+        self._lock = threading.Lock()
+
+    def sibling(self, voice_id):
+        parsed = parse_voice_id(voice_id)
+        if not parsed:
+            return None
+        language, name, quality = parsed
+        candidates = []
+        for other_id in self._voice_ids():
+            other = parse_voice_id(other_id)
+            if not other or other[0] != language or other[2] >= quality:
+                continue
+            if other[1] != name and not self.other_speakers:
+                continue
+            # Same speaker first, then the best quality below this one.
+            candidates.append((other[1] != name, -other[2], other_id))
+        return min(candidates)[2] if candidates else None
+
+    def downgrade(self, segments):
+        """
+        Segments with faster voices, or None when disabled or there are
+        none to switch to.
+        """
+        if not self.enabled:
+            return None
+        siblings = {}
+        downgraded = []
+        for segment in segments:
+            if segment.text and segment.voice_id not in siblings:
+                siblings[segment.voice_id] = self.sibling(segment.voice_id)
+            sibling = siblings.get(segment.voice_id)
+            if sibling:
+                segment = copy.copy(segment)
+                segment.voice_id = sibling
+            downgraded.append(segment)
+        if not any(siblings.values()):
+            return None
+        with self._lock:
+            self.downgraded += 1
+        return downgraded
+
+    def stats(self):
+        return {
+            "enabled": int(self.enabled),
+            "other-speakers": int(self.other_speakers),
+            "downgraded": self.downgraded,
+        }
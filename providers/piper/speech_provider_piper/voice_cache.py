@@ -0,0 +1,157 @@
+# SPDX-License-Identifer: GPL-3.0-or-later
+
+from collections import OrderedDict
+from gi.repository import GLib
+from pathlib import Path
+import json
+import os
+import threading
+from .convert import convert, shared_model_path
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# Load weights through a memory mapping that is shared with other processes
+# using the same voices, converting models to the format that allows it.
+SHARED_MODELS = bool(os.environ.get("PIPER_SHARED_MODELS"))
+
+
+class _CachedVoice(object):
+    def __init__(self, voice, size):
+        self.voice = voice
+        self.size = size
+        self.users = 0
+
+
+class VoiceCache(object):
+    """
+    Keeps recently used voices loaded, least recently used first out.
+    Models are weighed by their size on disk, and a voice that is acquired
+    by a synthesis in progress is never evicted.
+    """
+
+    def __init__(self, voices_dir, max_bytes=DEFAULT_MAX_BYTES, intra_op_threads=0):
+        self.voices_dir = voices_dir
+        self.max_bytes = max_bytes
+        self.intra_op_threads = intra_op_threads
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = 0
+        self._voices = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def _lookup(self, voice_id):
+        cached = self._voices.get(voice_id)
+        if cached:
+            self._voices.move_to_end(voice_id)
+            cached.users += 1
+        return cached
+
+    def acquire(self, voice_id):
+        with self._lock:
+            cached = self._lookup(voice_id)
+            if cached:
+                self.hits += 1
+                return cached.voice
+
+        # Only load one model at a time, another thread may have
+        # loaded this one while we waited.
+        with self._load_lock:
+            with self._lock:
+                cached = self._lookup(voice_id)
+                if cached:
+                    self.hits += 1
+                    return cached.voice
+
+            model_path = (self.voices_dir / voice_id).with_suffix(".onnx")
+            cached = _CachedVoice(self._load(model_path), model_path.stat().st_size)
+            cached.users = 1
+
+            with self._lock:
+                self.misses += 1
+                self._voices[voice_id] = cached
+                self._size += cached.size
+                self._evict()
+
+            return cached.voice
+
+    def _load(self, model_path):
+        # Like PiperVoice.load(), but lets us bound the threads each session
+        # uses so concurrent inferences don't oversubscribe the cores.
+        # Imported here since they are slow to import and not needed until
+        # a voice is loaded.
+        from piper import PiperVoice
+        from piper.config import PiperConfig
+        import onnxruntime
+
+        config = json.loads(Path(f"{model_path}.json").read_text())
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = self.intra_op_threads
+        if SHARED_MODELS:
+            shared_path = self._shared_model(model_path)
+            if shared_path:
+                model_path = shared_path
+                # Prepacking copies weights into private memory.
+                options.add_session_config_entry("session.disable_prepacking", "1")
+        return PiperVoice(
+            config=PiperConfig.from_dict(config),
+            session=onnxruntime.InferenceSession(
+                str(model_path),
+                sess_options=options,
+                providers=["CPUExecutionProvider"],
+            ),
+        )
+
+    def _shared_model(self, model_path):
+        # Converted when the voices were installed, or by us on first use.
+        shared_path = shared_model_path(model_path)
+        if shared_path.exists():
+            return shared_path
+        cache_dir = Path(GLib.get_user_cache_dir()) / "speech-provider-piper" / "models"
+        shared_path = shared_model_path(model_path, cache_dir)
+        if (
+            shared_path.exists()
+            and shared_path.stat().st_mtime >= model_path.stat().st_mtime
+        ):
+            return shared_path
+        try:
+            return convert(model_path, shared_path)
+        except Exception as e:
+            print(f"WARNING: failed to convert {model_path.name} for sharing:", e)
+            return None
+
+    def release(self, voice_id):
+        with self._lock:
+            cached = self._voices.get(voice_id)
+            if cached:
+                cached.users -= 1
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            for voice_id, cached in list(self._voices.items()):
+                if not cached.users:
+                    self._remove(voice_id)
+
+    def _remove(self, voice_id):
+        cached = self._voices.pop(voice_id)
+        self._size -= cached.size
+        self.evictions += 1
+
+    def _evict(self):
+        for voice_id, cached in list(self._voices.items()):
+            if self._size <= self.max_bytes:
+                break
+            if not cached.users:
+                self._remove(voice_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "voices": len(self._voices),
+                "bytes": self._size,
+                "max-bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
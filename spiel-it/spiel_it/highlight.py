@@ -0,0 +1,76 @@
+from gi.repository import GLib, Pango
+
+WORD = "current-range"
+SENTENCE = "current-sentence"
+
+
+class Highlighter(object):
+    """
+    Highlights the spoken word and sentence in a text view.
+
+    Speech events can come in much faster than frames are drawn, so they
+    only record the latest range per layer and the buffer is updated once
+    per frame. The highlighted ranges are kept as marks, so removing the
+    previous highlight doesn't need its offsets resolved again.
+    """
+
+    def __init__(self, text_view):
+        self.text_view = text_view
+        self.buffer = text_view.get_buffer()
+        self.buffer.create_tag(WORD, underline=Pango.Underline.SINGLE)
+        self.buffer.create_tag(SENTENCE, background="rgba(53, 132, 228, 0.15)")
+        # The word is drawn on top of the sentence
+        self.buffer.get_tag_table().lookup(WORD).set_priority(
+            self.buffer.get_tag_table().get_size() - 1
+        )
+        start = self.buffer.get_start_iter()
+        self._marks = {
+            layer: (
+                self.buffer.create_mark(None, start, True),
+                self.buffer.create_mark(None, start, False),
+            )
+            for layer in (WORD, SENTENCE)
+        }
+        self._highlighted = set()
+        self._pending = {}
+        self._tick_id = 0
+
+    def highlight(self, layer, begin, end):
+        self._pending[layer] = (begin, end)
+        if not self._tick_id:
+            self._tick_id = self.text_view.add_tick_callback(self._on_tick)
+
+    def clear(self):
+        self._pending.clear()
+        if self._tick_id:
+            self.text_view.remove_tick_callback(self._tick_id)
+            self._tick_id = 0
+        for layer in list(self._highlighted):
+            self._unhighlight(layer)
+
+    def _unhighlight(self, layer):
+        begin_mark, end_mark = self._marks[layer]
+        self.buffer.remove_tag_by_name(
+            layer,
+            self.buffer.get_iter_at_mark(begin_mark),
+            self.buffer.get_iter_at_mark(end_mark),
+        )
+        self._highlighted.discard(layer)
+
+    def _on_tick(self, widget, frame_clock):
+        self._tick_id = 0
+        for layer, (begin, end) in self._pending.items():
+            if layer in self._highlighted:
+                self._unhighlight(layer)
+            # Moving marks invalidates iters, so only resolve one at a time.
+            begin_mark, end_mark = self._marks[layer]
+            self.buffer.move_mark(begin_mark, self.buffer.get_iter_at_offset(begin))
+            self.buffer.move_mark(end_mark, self.buffer.get_iter_at_offset(end))
+            self.buffer.apply_tag_by_name(
+                layer,
+                self.buffer.get_iter_at_mark(begin_mark),
+                self.buffer.get_iter_at_mark(end_mark),
+            )
+            self._highlighted.add(layer)
+        self._pending.clear()
+        return GLib.SOURCE_REMOVE
@@ -1,5 +1,6 @@
 import gi
 from gi.repository import GLib
+import os
 import pathlib
 from time import time
 
@@ -8,6 +9,9 @@ gi.require_version("Spiel", "1.0")
 gi.require_version("Adw", "1")
 gi.require_version("Pango", "1.0")
 from gi.repository import Spiel, Gtk, Adw, Gdk, Pango
+from spiel_it.prefetch import Prefetcher, PREFETCH_MAX_CHARS
+from spiel_it.highlight import Highlighter, WORD, SENTENCE
+from spiel_it.reader import Reader, MAX_CHUNK_CHARS
 
 CSS = """
 .overlay-button {
@@ -74,14 +78,52 @@ class SpielItApp(Adw.Application):
         self.speaker.connect("notify::speaking", self._on_speaker_update)
         self.speaker.connect("notify::paused", self._on_speaker_update)
         self.speaker.connect("utterance-started", self._on_utterance_started)
-        self.speaker.connect("range-started", self._on_range_started_cb)
-        self.speaker.connect("word-started", self._on_range_started_cb)
-        self.speaker.connect("sentence-started", self._on_range_started_cb)
+        self.speaker.connect("range-started", self._on_range_started_cb, WORD)
+        self.speaker.connect("word-started", self._on_range_started_cb, WORD)
+        self.speaker.connect("sentence-started", self._on_range_started_cb, SENTENCE)
 
         self.voices_select.set_model(self.speaker.props.voices)
 
-        self.current_spoken_range = [None, None]
-        self.buffer.create_tag("current-range", underline=Pango.Underline.SINGLE)
+        self.highlighter = Highlighter(self.text_view)
+        prefetch = bool(os.environ.get("SPIEL_IT_PREFETCH"))
+        # Playback starts with an utterance short enough to be prefetched.
+        self.reader = Reader(
+            self.speaker,
+            self.buffer,
+            self._new_utterance,
+            PREFETCH_MAX_CHARS if prefetch else MAX_CHUNK_CHARS,
+        )
+        # Moving the cursor while speaking continues from there.
+        self.buffer.connect("notify::cursor-position", self._on_cursor_moved)
+
+        # Synthesize ahead of play being pressed, so the provider has the
+        # audio cached.
+        self.prefetcher = None
+        if prefetch:
+            self.prefetcher = Prefetcher()
+            self.buffer.connect("changed", self._on_prefetch_input_changed)
+            self.rate.connect("value-changed", self._on_prefetch_input_changed)
+            self.voices_select.connect(
+                "notify::selected-item", self._on_prefetch_input_changed
+            )
+            self._on_prefetch_input_changed()
+
+    def _on_prefetch_input_changed(self, *args):
+        # Prefetch what play would speak first
+        chunk = self.reader.chunk_at(
+            self.reader.sentence_start(self._play_offset()),
+            self.reader.first_chunk_chars,
+        )
+        start, end = chunk or (0, 0)
+        self.prefetcher.schedule(
+            self.buffer.get_text(
+                self.buffer.get_iter_at_offset(start),
+                self.buffer.get_iter_at_offset(end),
+                False,
+            ),
+            self.voices_select.get_selected_item(),
+            self.rate.get_value(),
+        )
 
     def _on_header_factory_setup(self, factory, list_item):
         label = Gtk.Label(max_width_chars=5, ellipsize=Pango.EllipsizeMode.END)
@@ -116,19 +158,32 @@ class SpielItApp(Adw.Application):
             self.speaker.resume()
 
     def _on_stop_clicked(self, button):
-        self.speaker.cancel()
+        self.reader.stop()
 
-    def _speak(self):
-        buffer = self.buffer
-        utterance = Spiel.Utterance(
-            text=buffer.get_text(buffer.get_start_iter(), buffer.get_end_iter(), False)
-        )
+    def _on_cursor_moved(self, buffer, param):
+        if self.speaker.props.speaking:
+            self.reader.play(buffer.props.cursor_position)
+        elif self.prefetcher:
+            self._on_prefetch_input_changed()
+
+    def _play_offset(self):
+        # Start at the cursor, or from the top when it is at the end.
+        offset = self.buffer.props.cursor_position
+        return 0 if offset >= self.buffer.get_char_count() else offset
+
+    def _new_utterance(self, text):
+        utterance = Spiel.Utterance(text=text)
         utterance.props.volume = self.volume.get_value()
         utterance.props.rate = self.rate.get_value()
         utterance.props.pitch = self.pitch.get_value()
         utterance.props.voice = self.voices_select.get_selected_item()
+        return utterance
+
+    def _speak(self):
         self._press_speak_time = time()
-        self.speaker.speak(utterance)
+        if self.prefetcher:
+            self.prefetcher.cancel_pending()
+        self.reader.play(self._play_offset())
 
     def _on_speaker_update(self, speaker, param):
         if param.name == "speaking":
@@ -139,9 +194,7 @@ class SpielItApp(Adw.Application):
             else:
                 self.playpause_button.set_icon_name("media-playback-start")
                 self.stop_button.set_visible(False)
-                begin_iter, end_iter = self.current_spoken_range
-                if begin_iter is not None and end_iter is not None:
-                    self.buffer.remove_tag_by_name("current-range", begin_iter, end_iter)
+                self.highlighter.clear()
 
         if param.name == "paused" and self.speaker.props.speaking:
             if not self.speaker.props.paused:
@@ -153,15 +206,12 @@ class SpielItApp(Adw.Application):
         self.playpause_button.set_icon_name("media-playback-pause")
         self.stop_button.set_visible(True)
 
-    def _on_range_started_cb(self, speaker, utterance, begin, end):
-        begin_iter, end_iter = self.current_spoken_range
-        buffer = self.text_view.get_buffer()
-        if begin_iter is not None and end_iter is not None:
-            buffer.remove_tag_by_name("current-range", begin_iter, end_iter)
-        begin_iter = buffer.get_iter_at_offset(begin)
-        end_iter = buffer.get_iter_at_offset(end)
-        buffer.apply_tag_by_name("current-range", begin_iter, end_iter)
-        self.current_spoken_range = [begin_iter, end_iter]
+    def _on_range_started_cb(self, speaker, utterance, begin, end, layer):
+        offset = self.reader.offset_of(utterance)
+        if offset is None:
+            # Left over from an utterance cancelled by a seek or stop
+            return
+        self.highlighter.highlight(layer, offset + begin, offset + end)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,113 @@
+from gi.repository import Gio, GLib
+import os
+
+# Wait for typing to pause before synthesizing
+PREFETCH_DELAY_MS = 600
+# Providers don't cache utterances of more than 1MiB of audio, that is
+# about 12 seconds of float samples at 22khz, or some 180 characters. Longer
+# texts would be synthesized and thrown away, so only the start of what
+# play speaks is prefetched, it decides how soon audio starts.
+PREFETCH_MAX_CHARS = 150
+
+
+class Prefetcher(object):
+    """
+    Speculatively synthesizes the text that is likely to be spoken next, so
+    the provider has the audio in its cache when play is pressed. The audio
+    itself is read and thrown away.
+
+    Every change reschedules the prefetch, and one that is in progress is
+    abandoned by closing our end of the pipe, which stops the provider.
+    """
+
+    def __init__(self):
+        self._connection = Gio.bus_get_sync(Gio.BusType.SESSION, None)
+        self._timeout_id = 0
+        self._pending = None
+        self._fetching = None
+        self._fetched = None
+        self._reader = None
+        self._cancellable = None
+
+    def schedule(self, text, voice, rate):
+        self.cancel_pending()
+        if not voice or not text.strip() or len(text) > PREFETCH_MAX_CHARS:
+            self.cancel()
+            return
+        provider = voice.props.provider
+        request = (
+            provider.props.well_known_name,
+            voice.props.identifier,
+            text,
+            rate,
+        )
+        if request in (self._fetched, self._fetching):
+            return
+        self.cancel()
+        self._pending = request
+        self._timeout_id = GLib.timeout_add(PREFETCH_DELAY_MS, self._start)
+
+    def cancel_pending(self):
+        """Drops a prefetch that hasn't started yet."""
+        if self._timeout_id:
+            GLib.source_remove(self._timeout_id)
+            self._timeout_id = 0
+        self._pending = None
+
+    def cancel(self):
+        self.cancel_pending()
+        if self._cancellable:
+            self._cancellable.cancel()
+            self._cancellable = None
+        if self._reader:
+            GLib.source_remove(self._reader[0])
+            os.close(self._reader[1])
+            self._reader = None
+        self._fetching = None
+
+    def _start(self):
+        self._timeout_id = 0
+        request = self._pending
+        self._pending = None
+        name, voice_id, text, rate = request
+        r, w = os.pipe()
+        self._cancellable = Gio.Cancellable()
+        self._connection.call_with_unix_fd_list(
+            name,
+            "/" + name.replace(".", "/"),
+            "org.freedesktop.Speech.Provider",
+            "Synthesize",
+            GLib.Variant("(hssddbs)", (0, text, voice_id, 1.0, rate, False, "")),
+            None,
+            Gio.DBusCallFlags.NONE,
+            -1,
+            Gio.UnixFDList.new_from_array([w]),
+            self._cancellable,
+            self._on_synthesize_done,
+        )
+        watch_id = GLib.io_add_watch(
+            r,
+            GLib.PRIORITY_LOW,
+            GLib.IOCondition.IN | GLib.IOCondition.HUP | GLib.IOCondition.ERR,
+            self._on_audio,
+        )
+        self._reader = (watch_id, r)
+        self._fetching = request
+        return False
+
+    def _on_synthesize_done(self, connection, result):
+        try:
+            connection.call_with_unix_fd_list_finish(result)
+        except GLib.Error as e:
+            if not e.matches(Gio.io_error_quark(), Gio.IOErrorEnum.CANCELLED):
+                print("Prefetch failed:", e.message)
+
+    def _on_audio(self, fd, condition):
+        if condition & GLib.IOCondition.IN and os.read(fd, 1 << 16):
+            return True
+        # The provider is done, and has the audio cached.
+        os.close(fd)
+        self._reader = None
+        self._fetched = self._fetching
+        self._fetching = None
+        return False
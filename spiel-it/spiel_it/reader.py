@@ -0,0 +1,116 @@
+import re
+
+# Utterances are at most this long, longer paragraphs are split between
+# sentences.
+MAX_CHUNK_CHARS = 600
+# Utterances queued with the speaker ahead of the one being spoken
+QUEUE_AHEAD = 3
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_BREAK = re.compile(r"[.!?;。！？]\s+")
+
+
+class Reader(object):
+    """
+    Reads a text buffer a paragraph at a time, or a few sentences at a
+    time for long paragraphs. Utterances are created as playback gets to
+    them, so memory use doesn't depend on the length of the document.
+
+    Remembers where each queued utterance starts in the buffer, so the
+    offsets of its speech events can be mapped to buffer offsets.
+
+    The first utterance after play is at most `first_chunk_chars` long.
+    """
+
+    def __init__(
+        self, speaker, buffer, make_utterance, first_chunk_chars=MAX_CHUNK_CHARS
+    ):
+        self.speaker = speaker
+        self.buffer = buffer
+        self._make_utterance = make_utterance
+        self.first_chunk_chars = first_chunk_chars
+        self._max_chars = MAX_CHUNK_CHARS
+        self._offsets = {}
+        self._next_offset = None
+        speaker.connect("utterance-finished", self._on_utterance_done)
+        speaker.connect("utterance-canceled", self._on_utterance_done)
+        speaker.connect("utterance-error", self._on_utterance_error)
+
+    def _text(self, start, end):
+        return self.buffer.get_text(
+            self.buffer.get_iter_at_offset(start),
+            self.buffer.get_iter_at_offset(end),
+            False,
+        )
+
+    def chunk_at(self, offset, max_chars=MAX_CHUNK_CHARS):
+        """Returns the (start, end) of the chunk at offset, or None at the end."""
+        window = self._text(offset, offset + max_chars)
+        stripped = window.lstrip()
+        if not stripped:
+            return None
+        start = offset + len(window) - len(stripped)
+        window = stripped
+        paragraph = _PARAGRAPH_BREAK.search(window)
+        if paragraph:
+            return start, start + paragraph.start()
+        if start + len(window) >= self.buffer.get_char_count():
+            return start, start + len(window.rstrip())
+        # Too long for one utterance, end at the last sentence in it.
+        sentences = list(_SENTENCE_BREAK.finditer(window))
+        if sentences:
+            return start, start + sentences[-1].end()
+        space = window.rfind(" ")
+        if space > 0:
+            return start, start + space
+        return start, start + len(window)
+
+    def sentence_start(self, offset):
+        """The start of the sentence containing offset."""
+        window_start = max(0, offset - MAX_CHUNK_CHARS)
+        window = self._text(window_start, offset)
+        start = 0
+        for match in _SENTENCE_BREAK.finditer(window):
+            start = match.end()
+        for match in _PARAGRAPH_BREAK.finditer(window):
+            start = max(start, match.end())
+        if not start and window_start:
+            return offset
+        return window_start + start
+
+    def play(self, offset=0):
+        self.stop()
+        self._next_offset = self.sentence_start(offset)
+        self._max_chars = self.first_chunk_chars
+        self._fill_queue()
+
+    def stop(self):
+        self._next_offset = None
+        if self._offsets:
+            self.speaker.cancel()
+        self._offsets.clear()
+
+    def offset_of(self, utterance):
+        """Where utterance starts in the buffer, None if it isn't queued."""
+        return self._offsets.get(utterance)
+
+    def _fill_queue(self):
+        while self._next_offset is not None and len(self._offsets) < QUEUE_AHEAD:
+            chunk = self.chunk_at(self._next_offset, self._max_chars)
+            self._max_chars = MAX_CHUNK_CHARS
+            if not chunk:
+                self._next_offset = None
+                break
+            start, end = chunk
+            utterance = self._make_utterance(self._text(start, end))
+            self._offsets[utterance] = start
+            self._next_offset = end
+            self.speaker.speak(utterance)
+
+    def _on_utterance_done(self, speaker, utterance):
+        if self._offsets.pop(utterance, None) is not None:
+            self._fill_queue()
+
+    def _on_utterance_error(self, speaker, utterance, error):
+        print("Utterance error:", error.message)
+        self._on_utterance_done(speaker, utterance)
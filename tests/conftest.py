@@ -0,0 +1,17 @@
+# SPDX-License-Identifer: GPL-3.0-or-later
+#
+# The packages are run from the source tree, like the benchmarks do.
+
+from pathlib import Path
+import os
+import sys
+import tempfile
+
+ROOT = Path(__file__).resolve().parent.parent
+for source in ["providers/common", "providers/piper", "spiel-it"]:
+    sys.path.insert(0, str(ROOT / source))
+
+# GLib reads these once, keep the caches of the tests out of the user's.
+_state_dir = tempfile.mkdtemp(prefix="speech-provider-tests-")
+os.environ["XDG_CACHE_HOME"] = os.path.join(_state_dir, "cache")
+os.environ["XDG_STATE_HOME"] = os.path.join(_state_dir, "state")
@@ -0,0 +1,101 @@
+# SPDX-License-Identifer: GPL-3.0-or-later
+
+import itertools
+import threading
+import pytest
+
+pytest.importorskip("gi")
+
+from speech_provider_common.audio_cache import AudioCache, cache_key
+
+_names = itertools.count()
+
+
+@pytest.fixture
+def make_cache():
+    # A cache directory of its own for every cache a test makes
+    name = f"test-audio-cache-{next(_names)}"
+
+    def make(**kwargs):
+        return AudioCache(name, **kwargs)
+
+    return make
+
+
+def test_cache_key():
+    assert cache_key("piper", "voice", "Hello  world") == cache_key(
+        "piper", "voice", " Hello world\n"
+    )
+    assert cache_key("piper", "voice", "Hello") != cache_key("piper", "other", "Hello")
+
+
+def test_memory_and_disk(make_cache):
+    cache = make_cache()
+    assert cache.get("key") is None
+    cache.put("key", 22050, b"audio")
+    assert cache.get("key") == (22050, b"audio")
+    cache.clear_memory()
+    assert cache.get("key") == (22050, b"audio")
+    # Across sessions
+    assert make_cache().get("key") == (22050, b"audio")
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+
+
+def test_none_key_is_never_cached(make_cache):
+    cache = make_cache()
+    cache.put(None, 22050, b"audio")
+    assert cache.get(None) is None
+    recorder = cache.recorder(None, 22050)
+    recorder.append(b"audio")
+    recorder.commit()
+    assert cache.stats()["memory-bytes"] == 0
+
+
+def test_recorder(make_cache):
+    cache = make_cache(max_entry_bytes=8)
+    recorder = cache.recorder("short", 16000)
+    buffer = bytearray(b"abc")
+    recorder.append(buffer)
+    # Reused by the caller
+    buffer[:] = b"def"
+    recorder.append(buffer)
+    recorder.commit()
+    assert cache.get("short") == (16000, b"abcdef")
+
+    recorder = cache.recorder("long", 16000)
+    recorder.append(b"12345")
+    recorder.append(b"67890")
+    recorder.commit()
+    assert cache.get("long") is None
+
+
+def test_eviction(make_cache):
+    cache = make_cache(memory_bytes=10, disk_bytes=30)
+    for key in "abcd":
+        cache.put(key, 16000, key.encode() * 6)
+    stats = cache.stats()
+    assert stats["memory-bytes"] <= 10
+    assert stats["disk-bytes"] <= 30
+    assert cache.get("a") is None
+    assert cache.get("d") == (16000, b"dddddd")
+
+
+def test_concurrent_puts_count_once(make_cache):
+    cache = make_cache()
+    threads = [
+        threading.Thread(target=cache.put, args=("key", 16000, b"x" * 100))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.stats()["disk-bytes"] == len(list(cache._dir.iterdir())) * 104
+
+
+def test_stale_temporary_files_are_removed(make_cache):
+    cache = make_cache()
+    (cache._dir / "interrupted.tmp").write_bytes(b"partial")
+    make_cache()
+    assert not (cache._dir / "interrupted.tmp").exists()
@@ -0,0 +1,83 @@
+# SPDX-License-Identifer: GPL-3.0-or-later
+
+from spiel_it.reader import MAX_CHUNK_CHARS, QUEUE_AHEAD, Reader
+
+
+class Buffer(object):
+    """The parts of a Gtk.TextBuffer the reader uses, iters are offsets."""
+
+    def __init__(self, text):
+        self.text = text
+
+    def get_iter_at_offset(self, offset):
+        return offset
+
+    def get_text(self, start, end, include_hidden):
+        return self.text[start:end]
+
+    def get_char_count(self):
+        return len(self.text)
+
+
+class Speaker(object):
+    def __init__(self):
+        self.spoken = []
+        self.cancelled = 0
+
+    def connect(self, *args):
+        pass
+
+    def speak(self, utterance):
+        self.spoken.append(utterance)
+
+    def cancel(self):
+        self.cancelled += 1
+
+
+PARAGRAPH = " ".join(f"This is sentence {i} of a long paragraph." for i in range(60))
+
+
+def reader(text, **kwargs):
+    speaker = Speaker()
+    return speaker, Reader(speaker, Buffer(text), lambda text: text, **kwargs)
+
+
+def test_paragraphs_are_utterances():
+    speaker, r = reader("First paragraph.\n\nSecond one.")
+    r.play()
+    assert speaker.spoken == ["First paragraph.", "Second one."]
+
+
+def test_long_paragraphs_are_split_between_sentences():
+    speaker, r = reader(PARAGRAPH)
+    r.play()
+    assert len(speaker.spoken) == QUEUE_AHEAD
+    for utterance in speaker.spoken:
+        assert len(utterance) <= MAX_CHUNK_CHARS
+        assert utterance.rstrip().endswith(".")
+    assert "".join(speaker.spoken) == PARAGRAPH[: len("".join(speaker.spoken))]
+
+
+def test_first_chunk_is_short():
+    speaker, r = reader(PARAGRAPH, first_chunk_chars=100)
+    r.play()
+    assert len(speaker.spoken[0]) <= 100
+    assert len(speaker.spoken[1]) > 100
+    assert r.chunk_at(0, 100) == (0, len(speaker.spoken[0]))
+
+
+def test_play_starts_at_the_sentence():
+    text = "One sentence. Another sentence."
+    speaker, r = reader(text)
+    r.play(text.rindex("sentence."))
+    assert speaker.spoken == ["Another sentence."]
+
+
+def test_offsets_of_utterances():
+    speaker, r = reader("First paragraph.\n\nSecond one.")
+    r.play()
+    assert r.offset_of("Second one.") == len("First paragraph.\n\n")
+    r.stop()
+    assert speaker.cancelled == 1
+    # Events of cancelled utterances are to be ignored.
+    assert r.offset_of("Second one.") is None
@@ -0,0 +1,96 @@
+# SPDX-License-Identifer: GPL-3.0-or-later
+
+import os
+import pytest
+
+pytest.importorskip("gi")
+
+from speech_provider_common.scheduler import (
+    SHORT_QUEUE_RESERVE,
+    QueueFull,
+    SynthesisRequest,
+    WorkerScheduler,
+)
+
+
+class Worker(object):
+    """Takes requests and finishes them when told to."""
+
+    def __init__(self):
+        self.requests = []
+        self._done = None
+
+    def connect(self, signal, callback):
+        self._done = callback
+
+    def synthesize(self, request):
+        self.requests.append(request)
+
+    def finish(self):
+        os.close(self.requests[-1].fd)
+        self._done(self)
+
+    def shutdown(self):
+        pass
+
+
+@pytest.fixture
+def requests():
+    # Keeps the client ends open, requests whose client is gone are dropped.
+    clients = []
+
+    def make(text):
+        read_fd, write_fd = os.pipe()
+        clients.append(read_fd)
+        return SynthesisRequest(write_fd, text, "", 1.0, 1.0)
+
+    yield make
+    for fd in clients:
+        os.close(fd)
+
+
+LONG = "A long read. " * 10
+
+
+def test_requests_wait_for_a_worker(requests):
+    workers = []
+    scheduler = WorkerScheduler(lambda: workers.append(Worker()) or workers[-1], 1)
+    first = requests(LONG)
+    scheduler.submit(first)
+    second, third = requests(LONG), requests(LONG)
+    scheduler.submit(second)
+    scheduler.submit(third)
+    short = requests("Yes")
+    scheduler.submit(short)
+    assert workers[0].requests == [first]
+    assert scheduler.stats()["queue-depth"] == 3
+
+    # Short requests jump ahead, then arrival order
+    for expected in (short, second, third):
+        workers[0].finish()
+        assert workers[0].requests[-1] is expected
+    workers[0].finish()
+    assert scheduler.is_idle
+    assert scheduler.stats()["completed"] == 4
+
+
+def test_full_queue_rejects_and_keeps_room_for_short_requests(requests):
+    max_queue = SHORT_QUEUE_RESERVE + 2
+    scheduler = WorkerScheduler(Worker, 1, max_queue)
+    scheduler.submit(requests(LONG))
+    for _ in range(2):
+        scheduler.submit(requests(LONG))
+    rejected = requests(LONG)
+    with pytest.raises(QueueFull):
+        scheduler.submit(rejected)
+    with pytest.raises(OSError):
+        # Its fd is closed
+        os.fstat(rejected.fd)
+
+    for _ in range(SHORT_QUEUE_RESERVE):
+        scheduler.submit(requests("Yes"))
+    with pytest.raises(QueueFull):
+        scheduler.submit(requests("Yes"))
+    stats = scheduler.stats()
+    assert stats["queue-depth"] == max_queue
+    assert stats["rejected"] == 2
@@ -0,0 +1,156 @@
+# SPDX-License-Identifer: GPL-3.0-or-later
+
+from types import SimpleNamespace
+import pytest
+from speech_provider_common.ssml import (
+    MAX_BREAK_SECONDS,
+    MAX_PROSODY,
+    parse_ssml,
+    plan_segments,
+)
+
+
+def request(text, voice_id="", pitch=1.0, rate=1.0, is_ssml=False, language=""):
+    # The fields of a SynthesisRequest that planning looks at
+    return SimpleNamespace(
+        text=text,
+        voice_id=voice_id,
+        pitch=pitch,
+        rate=rate,
+        is_ssml=is_ssml,
+        language=language,
+    )
+
+
+def spoken(segments):
+    return [(segment.text, segment.rate, segment.pitch) for segment in segments]
+
+
+def test_plain_text_is_one_segment():
+    segments = parse_ssml("<speak>Hello <emphasis>there</emphasis>.</speak>")
+    assert spoken(segments) == [("Hello there.", 1.0, 1.0)]
+
+
+def test_fragment_without_speak_root():
+    segments = parse_ssml("Hello <emphasis>there</emphasis>.")
+    assert [segment.text for segment in segments] == ["Hello there."]
+
+
+def test_invalid_markup_is_spoken_without_tags():
+    segments = parse_ssml("<speak>Hello <b>there</speak>")
+    assert len(segments) == 1
+    assert segments[0].text.split() == ["Hello", "there"]
+
+
+def test_break_is_a_pause_with_the_surrounding_pitch():
+    segments = parse_ssml(
+        '<speak><prosody pitch="high">One.<break time="500ms"/>Two.</prosody></speak>'
+    )
+    assert [segment.text for segment in segments] == ["One.", "", "Two."]
+    assert segments[1].pause == 0.5
+    assert len({segment.pitch for segment in segments}) == 1
+
+
+def test_break_strength_and_limit():
+    segments = parse_ssml('<speak>A<break strength="strong"/>B<break time="1h"/></speak>')
+    assert segments[1].pause == 0.75
+    segments = parse_ssml('<speak>A<break time="100s"/>B</speak>')
+    assert segments[1].pause == MAX_BREAK_SECONDS
+
+
+@pytest.mark.parametrize(
+    "value, rate",
+    [
+        ("x-slow", 0.5),
+        ("fast", 1.25),
+        ("150%", 1.5),
+        ("+50%", 1.5),
+        ("-50%", 0.5),
+        ("2", 2.0),
+    ],
+)
+def test_prosody_rate(value, rate):
+    segments = parse_ssml(f'<speak><prosody rate="{value}">x</prosody></speak>')
+    assert segments[0].rate == pytest.approx(rate)
+
+
+def test_prosody_is_relative_to_the_request():
+    segments = parse_ssml(
+        '<speak><prosody rate="fast">x</prosody></speak>', rate=2.0, pitch=0.5
+    )
+    assert segments[0].rate == pytest.approx(2.5)
+    assert segments[0].pitch == 0.5
+
+
+def test_nested_relative_prosody():
+    segments = parse_ssml(
+        '<speak><prosody rate="+100%"><prosody rate="+100%">x</prosody></prosody></speak>'
+    )
+    assert segments[0].rate == pytest.approx(4.0)
+
+
+@pytest.mark.parametrize("value", ["0%", "-100%", "-200%", "0", "nan", "bogus"])
+def test_prosody_rate_that_is_not_positive_is_ignored(value):
+    segments = parse_ssml(f'<speak><prosody rate="{value}">x</prosody></speak>')
+    assert segments[0].rate == 1.0
+
+
+def test_prosody_is_clamped():
+    segments = parse_ssml(
+        '<speak><prosody rate="100000%" pitch="+120st">x</prosody></speak>'
+    )
+    assert segments[0].rate == MAX_PROSODY
+    assert segments[0].pitch == MAX_PROSODY
+
+
+def test_prosody_pitch():
+    segments = parse_ssml(
+        '<speak>Low <prosody pitch="high">high</prosody> low</speak>'
+    )
+    assert spoken(segments) == [
+        ("Low", 1.0, 1.0),
+        ("high", 1.0, 1.15),
+        ("low", 1.0, 1.0),
+    ]
+
+
+def test_voice_and_language():
+    segments = parse_ssml(
+        '<speak>One <voice name="other">two</voice> '
+        '<s xml:lang="de">drei</s></speak>',
+        voice_id="default",
+        language="en",
+    )
+    assert [(s.text, s.voice_id, s.language) for s in segments] == [
+        ("One", "default", "en"),
+        ("two", "other", "en"),
+        ("drei", "", "de"),
+    ]
+
+
+def test_sub_alias_and_skipped_elements():
+    segments = parse_ssml(
+        '<speak><sub alias="World Wide Web">WWW</sub> <desc>no</desc>'
+        '<mark name="m"/>yes</speak>'
+    )
+    assert [segment.text for segment in segments] == ["World Wide Web yes"]
+
+
+def test_plan_segments_picks_voices_for_languages():
+    voices = {"en": "english", "de": "german"}
+    segments = plan_segments(
+        request(
+            '<speak>One <s xml:lang="de">zwei</s></speak>', is_ssml=True, language="en"
+        ),
+        voices.get,
+    )
+    assert [(s.text, s.voice_id) for s in segments] == [
+        ("One", "english"),
+        ("zwei", "german"),
+    ]
+
+
+def test_plan_segments_of_plain_text():
+    segments = plan_segments(request("<not markup>", "voice", pitch=1.5, rate=0.0))
+    assert spoken(segments) == [("<not markup>", 1.0, 1.5)]
+    assert segments[0].voice_id == "voice"
@@ -0,0 +1,25 @@
+# SPDX-License-Identifer: GPL-3.0-or-later
+
+from speech_provider_common.text import FIRST_CHUNK_LENGTH, split_sentences
+
+
+def test_sentences_and_paragraphs():
+    assert split_sentences("One. Two? Three!\n\nFour\n\n\nFive") == [
+        "One.",
+        "Two?",
+        "Three!",
+        "Four",
+        "Five",
+    ]
+
+
+def test_blank_text():
+    assert split_sentences("  \n\n ") == []
+
+
+def test_long_first_sentence_is_split_at_a_clause():
+    first = "A long first clause, " + "word " * (FIRST_CHUNK_LENGTH // 5)
+    chunks = split_sentences(first.strip() + ". Then, a second sentence.")
+    assert chunks[0] == "A long first clause,"
+    # Only the first sentence is split.
+    assert chunks[-1] == "Then, a second sentence."
@@ -0,0 +1,58 @@
+# SPDX-License-Identifer: GPL-3.0-or-later
+
+from speech_provider_common.ssml import Segment
+from speech_provider_piper.tiers import QualityTiers, parse_voice_id
+
+VOICES = [
+    "en_US-lessac-medium",
+    "en_US-lessac-low",
+    "en_US-amy-x_low",
+    "en_GB-alan-medium",
+    "de_DE-ramona-low",
+]
+
+
+def test_parse_voice_id():
+    assert parse_voice_id("en_US-lessac-medium") == ("en_US", "lessac", 2)
+    assert parse_voice_id("en_US-some-name-x_low") == ("en_US", "some-name", 0)
+    assert parse_voice_id("custom") is None
+
+
+def test_sibling_is_a_lower_quality_of_the_same_speaker():
+    tiers = QualityTiers(lambda: VOICES, enabled=True)
+    assert tiers.sibling("en_US-lessac-medium") == "en_US-lessac-low"
+    assert tiers.sibling("en_US-lessac-low") is None
+    assert tiers.sibling("en_GB-alan-medium") is None
+
+
+def test_other_speakers_are_opt_in():
+    tiers = QualityTiers(lambda: VOICES, enabled=True, other_speakers=True)
+    assert tiers.sibling("en_US-lessac-low") == "en_US-amy-x_low"
+    # Never another language
+    assert tiers.sibling("de_DE-ramona-low") is None
+
+
+def test_downgrade():
+    tiers = QualityTiers(lambda: VOICES, enabled=True)
+    segments = [
+        Segment("One", "en_US-lessac-medium"),
+        Segment(pause=1.0),
+        Segment("Two", "en_GB-alan-medium"),
+    ]
+    downgraded = tiers.downgrade(segments)
+    assert [segment.voice_id for segment in downgraded] == [
+        "en_US-lessac-low",
+        "",
+        "en_GB-alan-medium",
+    ]
+    # The segments planned for the request are left alone.
+    assert segments[0].voice_id == "en_US-lessac-medium"
+    assert tiers.stats()["downgraded"] == 1
+
+
+def test_downgrade_without_siblings_or_disabled():
+    segments = [Segment("One", "en_US-lessac-medium")]
+    assert QualityTiers(lambda: VOICES, enabled=False).downgrade(segments) is None
+    tiers = QualityTiers(lambda: ["en_US-lessac-medium"], enabled=True)
+    assert tiers.downgrade(segments) is None
+    assert tiers.stats()["downgraded"] == 0